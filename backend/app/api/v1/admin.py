@@ -0,0 +1,38 @@
+# backend/app/api/v1/admin.py
+from fastapi import APIRouter, Depends
+
+from app.api.deps import get_current_admin
+from app.models.user import User
+from app.services.answer_cache import answer_cache
+from app.services.content_version import content_versions
+from app.services.lexical import lexical_indexes
+from app.services.llm_scheduler import llm_scheduler
+from app.services.memory import conversation_memories
+from app.services.retrieval import query_embedding_cache
+from app.services.single_flight import single_flight
+from app.services.vector_gc import reconcile_vectors
+from app.utils.embedding_cache import embedding_cache
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+@router.get("/metrics")
+async def get_metrics(current_user: User = Depends(get_current_admin)):
+    """Runtime counters for caches and background workers"""
+    return {
+        "embedding_cache": embedding_cache.stats(),
+        "query_embedding_cache": query_embedding_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "lexical_indexes": lexical_indexes.stats(),
+        "content_versions": content_versions.stats(),
+        "llm_scheduler": llm_scheduler.stats(),
+        "single_flight": single_flight.stats(),
+        "conversation_memories": conversation_memories.stats(),
+    }
+
+@router.post("/vectors/reconcile")
+async def reconcile_vector_store(
+    dry_run: bool = False,
+    current_user: User = Depends(get_current_admin)
+):
+    """Remove vectors left behind by deleted documents and agents"""
+    return await reconcile_vectors(dry_run=dry_run)
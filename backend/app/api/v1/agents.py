@@ -4,14 +4,22 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update, delete
 from uuid import UUID
 from datetime import datetime
+import logging
 
 from app.db.session import get_db
 from app.api.deps import get_current_user
 from app.schemas.agent import AgentCreate, AgentOut
 from app.models.user import User
 from app.models.agent import Agent
+from app.models.document import Document
+from app.models.conversation_summary import ConversationSummary
+from app.services.answer_cache import answer_cache
+from app.services.content_version import content_versions
+from app.services.lexical import lexical_indexes
+from app.services.vector_gc import purge_agent_vectors
 
 router = APIRouter(prefix="/agents", tags=["Agents"])
+logger = logging.getLogger(__name__)
 
 @router.get("/", response_model=list[AgentOut])
 async def list_agents(
@@ -43,6 +51,7 @@ async def create_agent(
             name=agent_in.name,
             description=agent_in.description,
             instructions=agent_in.instructions,
+            context_token_budget=agent_in.context_token_budget,
             owner_id=current_user.id,
             created_at=datetime.utcnow(),
             updated_at=datetime.utcnow()
@@ -110,12 +119,11 @@ async def update_agent(
                 name=agent_in.name,
                 description=agent_in.description,
                 instructions=agent_in.instructions,
+                context_token_budget=agent_in.context_token_budget,
                 updated_at=datetime.utcnow()
             )
         )
         await db.commit()
-        await db.refresh(agent)
-        return agent
     except Exception as e:
         await db.rollback()
         raise HTTPException(
@@ -123,6 +131,16 @@ async def update_agent(
             detail=f"Error updating agent: {str(e)}"
         )
 
+    # Name and instructions are part of every prompt: the new version makes open
+    # chats (in any process) rebuild theirs and retires answers cached under the old one
+    answer_cache.invalidate(agent_id)
+    try:
+        await content_versions.bump(agent_id)
+    except Exception as e:
+        logger.warning(f"Failed to bump content version of agent {agent_id}: {str(e)}")
+    await db.refresh(agent)
+    return agent
+
 @router.delete("/{agent_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_agent(
     agent_id: UUID,
@@ -145,6 +163,12 @@ async def delete_agent(
         )
     
     try:
+        await db.execute(
+            delete(Document).where(Document.agent_id == agent_id)
+        )
+        await db.execute(
+            delete(ConversationSummary).where(ConversationSummary.agent_id == agent_id)
+        )
         await db.execute(
             delete(Agent).where(Agent.id == agent_id)
         )
@@ -154,4 +178,13 @@ async def delete_agent(
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Error deleting agent: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+    answer_cache.invalidate(agent_id)
+    lexical_indexes.drop(str(agent_id))
+    content_versions.forget(agent_id)
+    try:
+        await purge_agent_vectors(agent_id)
+    except Exception as e:
+        # The rows are gone; leftover vectors are removed by reconciliation
+        logger.warning(f"Failed to purge vectors of agent {agent_id}: {str(e)}")
\ No newline at end of file
@@ -2,6 +2,7 @@
 
 import asyncio
 from asyncio.log import logger
+import json
 import logging
 from fastapi import APIRouter, Depends, status , WebSocket, WebSocketDisconnect, Query
 from fastapi import status
@@ -11,13 +12,14 @@ from jose import JWTError, jwt
 from datetime import datetime
 import time
 from typing import Optional, Callable, Awaitable
-from uuid import UUID
+from uuid import UUID, uuid4
 from collections import defaultdict
 
 from app.api.deps import get_current_user
 from app.db.session import get_db
 from app.schemas.chat import ChatRequest, ChatResponse
 from app.services.chat import get_qa_chain
+from app.services.llm_scheduler import SchedulerBusy
 from app.models.user import User
 from app.models.message import Message
 from app.models.agent import Agent
@@ -32,6 +34,33 @@ logger = logging.getLogger(__name__)
 active_connections = defaultdict(dict)
 MAX_CONNECTIONS_PER_USER = 5
 
+def wants_stream(data: str) -> bool:
+    """Streaming is opt-in per message: {"query": "...", "stream": true}"""
+    try:
+        message = json.loads(data)
+    except json.JSONDecodeError:
+        return False
+    return isinstance(message, dict) and message.get("stream") is True
+
+async def stream_answer(websocket: WebSocket, qa_chain, data: str) -> None:
+    """Send an answer as start, delta... and end frames sharing the AI message id"""
+    message_id = str(uuid4())
+    await websocket.send_json({"type": "start", "message_id": message_id})
+
+    async def send_delta(text: str) -> None:
+        await websocket.send_json({"type": "delta", "message_id": message_id, "content": text})
+
+    try:
+        response = await qa_chain(data, on_token=send_delta, message_id=UUID(message_id))
+    except SchedulerBusy as e:
+        await websocket.send_json({"type": "error", "message_id": message_id, "code": "busy", "detail": str(e)})
+        return
+    except Exception as e:
+        logger.error(f"WebSocket error: {str(e)}", exc_info=True)
+        await websocket.send_json({"type": "error", "message_id": message_id, "detail": str(e)})
+        return
+    await websocket.send_json({"type": "end", "message_id": message_id, "content": response})
+
 async def validate_websocket_token(token: str, db: AsyncSession) -> Optional[User]:
     """Validate JWT token for WebSocket connections"""
     try:
@@ -91,7 +120,13 @@ async def websocket_endpoint(
                     continue
                 
                 # Process the message
-                response = await qa_chain(data)
+                if wants_stream(data):
+                    await stream_answer(websocket, qa_chain, data)
+                    continue
+                try:
+                    response = await qa_chain(data)
+                except SchedulerBusy as e:
+                    response = str(e)
                 await websocket.send_text(response)
 
             except asyncio.TimeoutError:
@@ -1,15 +1,49 @@
 # backend/app/api/v1/documents.py
+import logging
 from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
 from uuid import UUID
 from app.db.session import get_db
 from app.api.deps import get_current_user
-from app.schemas.document import DocumentResponse
+from app.schemas.document import DocumentResponse, DocumentStatusResponse, BulkUploadResponse
 from app.models.user import User
-from app.services.document import process_document
+from app.services.document import (
+    process_document,
+    process_bulk_upload,
+    replace_document,
+    UnsupportedFileType,
+    UploadTooLarge
+)
+from app.services.content_version import content_versions
+from app.services.ingestion import IngestionQueueFull
+from app.services.lexical import lexical_indexes
+from app.services.vector_gc import purge_document_vectors
+from app.models.agent import Agent
 from app.models.document import Document
 
 router = APIRouter(prefix="/documents", tags=["Documents"])
+logger = logging.getLogger(__name__)
+
+async def ensure_agent_owner(db: AsyncSession, agent_id: UUID, user: User) -> None:
+    """404 unless the agent belongs to the user"""
+    result = await db.execute(
+        select(Agent.id).where(Agent.id == agent_id, Agent.owner_id == user.id)
+    )
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(status_code=404, detail="Agent not found")
+
+async def get_owned_document(db: AsyncSession, document_id: UUID, user: User) -> Document:
+    """The document if it belongs to one of the user's agents, 404 otherwise"""
+    result = await db.execute(
+        select(Document)
+        .join(Agent, Agent.id == Document.agent_id)
+        .where(Document.id == document_id, Agent.owner_id == user.id)
+    )
+    doc = result.scalar_one_or_none()
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return doc
 
 @router.get("/agent", response_model=list[DocumentResponse])
 async def get_agent_documents(
@@ -26,25 +60,91 @@ async def get_agent_documents(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/upload", response_model=DocumentResponse)
+@router.post("/upload", response_model=DocumentResponse, status_code=202)
 async def upload_document(
     file: UploadFile = File(...),
     agent_id: UUID = Form(...),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
+    """Queue a document for ingestion; poll /documents/{id}/status for progress"""
+    await ensure_agent_owner(db, agent_id, current_user)
     try:
         doc = await process_document(str(agent_id), file, db)
         return doc
+    except HTTPException:
+        raise
+    except UnsupportedFileType as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except IngestionQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/bulk", response_model=BulkUploadResponse, status_code=202)
+async def bulk_upload_documents(
+    files: list[UploadFile] = File(...),
+    agent_id: UUID = Form(...),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Queue many files, or zip/tar archives of files, in one request"""
+    await ensure_agent_owner(db, agent_id, current_user)
+    try:
+        items = await process_bulk_upload(str(agent_id), files, db)
+    except HTTPException:
+        raise
+    except IngestionQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return BulkUploadResponse(
+        queued=sum(1 for i in items if i["status"] == "queued"),
+        duplicates=sum(1 for i in items if i["status"] == "duplicate"),
+        failed=sum(1 for i in items if i["status"] == "error"),
+        items=items
+    )
+
+@router.put("/{document_id}", response_model=DocumentResponse, status_code=202)
+async def replace_document_file(
+    document_id: UUID,
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Upload a new revision of a document; only changed chunks are re-embedded"""
+    await get_owned_document(db, document_id, current_user)
+    try:
+        return await replace_document(document_id, file, db)
+    except HTTPException:
+        raise
+    except UnsupportedFileType as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except IngestionQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/{document_id}/status", response_model=DocumentStatusResponse)
+async def get_document_status(
+    document_id: UUID,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    return await get_owned_document(db, document_id, current_user)
+
 @router.delete("/{document_id}", status_code=204)
 async def delete_document(
     document_id: UUID,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
+    doc = await get_owned_document(db, document_id, current_user)
+    agent_id = doc.agent_id
     try:
         from sqlmodel import delete
         await db.execute(delete(Document).where(Document.id == document_id))
@@ -53,5 +153,15 @@ async def delete_document(
         await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
-
-
+    # Purged before the version moves on, so nothing read under the new
+    # version (cached answers, a lexical rebuild) can still see the chunks
+    try:
+        await purge_document_vectors(document_id, agent_id)
+    except Exception as e:
+        # The row is gone; leftover vectors are removed by reconciliation
+        logger.warning(f"Failed to purge vectors of document {document_id}: {str(e)}")
+    try:
+        version = await content_versions.bump(agent_id)
+        lexical_indexes.remove_document(str(agent_id), str(document_id), version)
+    except Exception as e:
+        logger.warning(f"Failed to bump content version of agent {agent_id}: {str(e)}")
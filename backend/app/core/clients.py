@@ -0,0 +1,165 @@
+# app/core/clients.py
+import json
+import logging
+import threading
+from typing import AsyncIterator, Optional
+
+import httpx
+from langchain_core.embeddings import Embeddings
+
+from app.core.config import settings
+from app.utils.embedding_cache import CachedEmbeddings, embedding_cache
+from app.vectorstores import VectorBackend, VectorCollection, create_backend
+
+logger = logging.getLogger(__name__)
+
+class OllamaClient:
+    """Ollama HTTP API over pooled keep-alive connections.
+
+    The sync client serves embedding calls made from worker threads, the
+    async client serves generation on the event loop. Generation requests
+    ask the server to keep the model, and with it the prompt cache of its
+    last requests, loaded for keep_alive.
+    """
+
+    def __init__(self, base_url: str, timeout: float, max_connections: int, keep_alive: Optional[str] = None):
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections
+        )
+        self.base_url = base_url
+        self.keep_alive = keep_alive
+        self._sync = httpx.Client(base_url=base_url, timeout=timeout, limits=limits)
+        self._async = httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits)
+
+    def embed(self, model: str, text: str) -> list[float]:
+        response = self._sync.post("/api/embeddings", json={"model": model, "prompt": text})
+        response.raise_for_status()
+        return response.json()["embedding"]
+
+    async def aembed(self, model: str, text: str) -> list[float]:
+        response = await self._async.post("/api/embeddings", json={"model": model, "prompt": text})
+        response.raise_for_status()
+        return response.json()["embedding"]
+
+    def _generate_request(self, model: str, prompt: str, options: Optional[dict], system: Optional[str], stream: bool) -> dict:
+        request = {"model": model, "prompt": prompt, "stream": stream, "options": options or {}}
+        if system is not None:
+            # Rendered by the model's template ahead of the prompt, replacing its default system message
+            request["system"] = system
+        if self.keep_alive is not None:
+            request["keep_alive"] = self.keep_alive
+        return request
+
+    async def agenerate(self, model: str, prompt: str, options: Optional[dict] = None, system: Optional[str] = None) -> str:
+        return (await self.agenerate_full(model, prompt, options, system))["response"]
+
+    async def agenerate_full(self, model: str, prompt: str, options: Optional[dict] = None, system: Optional[str] = None) -> dict:
+        """Generation result including timings and prompt_eval_count/eval_count"""
+        response = await self._async.post(
+            "/api/generate",
+            json=self._generate_request(model, prompt, options, system, stream=False)
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def astream_generate(
+        self,
+        model: str,
+        prompt: str,
+        options: Optional[dict] = None,
+        system: Optional[str] = None
+    ) -> AsyncIterator[dict]:
+        """Streamed generation: one dict per token, the last one (done=True) carries the counters"""
+        async with self._async.stream(
+            "POST",
+            "/api/generate",
+            json=self._generate_request(model, prompt, options, system, stream=True)
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if line:
+                    yield json.loads(line)
+
+    async def aclose(self) -> None:
+        self._sync.close()
+        await self._async.aclose()
+
+class OllamaEmbeddings(Embeddings):
+    """LangChain embeddings adapter on top of the shared OllamaClient"""
+
+    def __init__(self, client: OllamaClient, model: str):
+        self.client = client
+        self.model = model
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.client.embed(self.model, text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.client.embed(self.model, text)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return await self.client.aembed(self.model, text)
+
+class ClientRegistry:
+    """Process-wide Ollama client and vector store backend.
+
+    Created at application startup and closed on shutdown. Accessing a
+    client before startup (CLI scripts) creates it on demand.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ollama: Optional[OllamaClient] = None
+        self._vectors: Optional[VectorBackend] = None
+        self._embeddings: Optional[Embeddings] = None
+
+    @property
+    def ollama(self) -> OllamaClient:
+        with self._lock:
+            if self._ollama is None:
+                self._ollama = OllamaClient(
+                    settings.OLLAMA_BASE_URL,
+                    timeout=settings.OLLAMA_TIMEOUT,
+                    max_connections=settings.OLLAMA_MAX_CONNECTIONS,
+                    keep_alive=settings.OLLAMA_KEEP_ALIVE
+                )
+            return self._ollama
+
+    @property
+    def vectors(self) -> VectorBackend:
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = create_backend()
+            return self._vectors
+
+    @property
+    def embeddings(self) -> Embeddings:
+        """Embedding model used for chunks and queries, behind the embedding cache"""
+        if self._embeddings is None:
+            self._embeddings = CachedEmbeddings(
+                OllamaEmbeddings(self.ollama, settings.EMBEDDING_MODEL),
+                embedding_cache,
+                model=settings.EMBEDDING_MODEL
+            )
+        return self._embeddings
+
+    def collection(self, name: str) -> VectorCollection:
+        return self.vectors.get_collection(name)
+
+    async def startup(self) -> None:
+        self.ollama
+        self.vectors
+        logger.info(f"Clients ready (ollama={settings.OLLAMA_BASE_URL}, vectors={settings.VECTOR_BACKEND})")
+
+    async def shutdown(self) -> None:
+        if self._ollama is not None:
+            await self._ollama.aclose()
+        self._ollama = None
+        self._embeddings = None
+        if self._vectors is not None:
+            self._vectors.close()
+        self._vectors = None
+        logger.info("Clients closed")
+
+clients = ClientRegistry()
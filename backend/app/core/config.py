@@ -1,4 +1,5 @@
 # app/core/config.py
+from typing import Optional
 from pydantic import BaseSettings
 
 class Settings(BaseSettings):
@@ -19,6 +20,71 @@ class Settings(BaseSettings):
     DEBUG: bool = False  # ← Add this
     IS_SERVERLESS: bool = False  # ← Add this
 
+    # Model and vector store servers
+    OLLAMA_BASE_URL: str = "http://backend-ollama-1:11434"
+    OLLAMA_TIMEOUT: float = 300.0  # Seconds; CPU-only generation is slow
+    OLLAMA_MAX_CONNECTIONS: int = 20  # Keep-alive pool size per client
+    OLLAMA_KEEP_ALIVE: Optional[str] = "30m"  # How long the model and its prompt cache stay loaded after a request; unset for the server default
+    LLM_MODEL: str = "llama3"
+    LLM_NUM_CTX: int = 4096  # Context window requested from the model server, the same on every request
+    LLM_ANSWER_TOKENS: int = 512  # Part of LLM_NUM_CTX kept free for the answer
+    LLM_MAX_CONCURRENCY: int = 2  # Generations in flight; more requests wait in fair per-tenant queues
+    LLM_QUEUE_TIMEOUT: float = 30.0  # Seconds a generation may wait before a busy reply
+    LLM_TENANT_WEIGHTS: dict[str, float] = {}  # Owner id -> share of generation slots, default 1
+    CHROMA_HOST: Optional[str] = None  # Chroma server; embedded persistent store when unset
+    CHROMA_PORT: int = 8000
+    CHROMA_PERSIST_DIR: str = "data/chroma"
+
+    # Document ingestion
+    MAX_UPLOAD_BYTES: int = 512 * 1024 * 1024
+    UPLOAD_CHUNK_BYTES: int = 1024 * 1024  # Read/write size while streaming uploads
+    MAX_BULK_FILES: int = 5000  # Files per bulk request, archive members included
+    MAX_BULK_BYTES: int = 2 * 1024 * 1024 * 1024  # Bytes written per bulk request, measured after decompression
+    INGESTION_WORKERS: int = 2  # Concurrent parse/chunk/embed jobs
+    INGESTION_QUEUE_SIZE: int = 100  # Pending jobs before uploads are rejected
+    PARSER_PROCESSES: int = 2  # Worker processes for PDF/DOCX parsing
+    PARSER_PAGES_PER_TASK: int = 8  # PDF pages handed to a worker at a time
+    TABLE_ROWS_PER_CHUNK: int = 50  # CSV/Excel rows grouped under one header copy
+
+    # Embedding
+    EMBEDDING_MODEL: str = "llama3"
+    EMBEDDING_BATCH_SIZE: int = 32  # Chunks per vector store write
+    EMBEDDING_MAX_CONCURRENCY: int = 4  # Batches in flight to the embedding server, per process
+    EMBEDDING_MAX_RETRIES: int = 3
+    EMBEDDING_RETRY_BACKOFF: float = 1.0  # Seconds, doubled on every retry
+    EMBEDDING_CACHE_PATH: str = "data/embedding_cache.sqlite3"
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 500_000  # LRU-evicted beyond this
+
+    # Retrieval
+    QUERY_EMBEDDING_CACHE_SIZE: int = 10_000  # Entries; ~16KB each for llama3's 4096 dims
+    QUERY_EMBEDDING_CACHE_TTL: float = 24 * 60 * 60  # Seconds, 0 keeps entries until evicted
+    HYBRID_RETRIEVAL: bool = True  # Fuse BM25 with dense results, False for dense only
+    RETRIEVAL_CANDIDATES: int = 20  # Results taken from each retriever before fusion
+    RRF_K: int = 60  # Reciprocal rank fusion damping constant
+    RETRIEVAL_MMR_LAMBDA: float = 0.7  # Relevance vs. diversity of retrieved chunks, 1 disables diversity
+    LEXICAL_INDEX_MAX_AGENTS: int = 256  # BM25 indexes held in memory, LRU-evicted
+    CONTEXT_TOKEN_BUDGET: int = 1536  # Prompt tokens per turn unless the agent sets its own; capped at LLM_NUM_CTX - LLM_ANSWER_TOKENS
+    CONTEXT_HISTORY_SHARE: float = 0.25  # Budget share history may take from retrieved chunks
+    HISTORY_WINDOW_TOKENS: int = 512  # Recent messages sent verbatim; older ones are only in the summary
+    HISTORY_WINDOW_MESSAGES: int = 20  # Upper bound on recent messages read per turn
+    HISTORY_SUMMARY_TOKENS: int = 200  # Target length of the running conversation summary
+    HISTORY_SUMMARY_BATCH: int = 4  # Messages past the window before the summary is refreshed
+    ANSWER_CACHE_MODE: str = "exact"  # exact, semantic (embedding similarity) or off
+    ANSWER_CACHE_SIZE: int = 256  # Answers kept per agent
+    ANSWER_CACHE_TTL: float = 24 * 60 * 60  # Seconds
+    ANSWER_CACHE_SIMILARITY: float = 0.95  # Cosine similarity needed for a semantic hit
+    CONTENT_VERSION_TTL: float = 2.0  # Seconds an agent's cached content version is trusted
+
+    # Vector store
+    VECTOR_BACKEND: str = "chroma"  # chroma, or local (in-process, memory-mapped)
+    LOCAL_VECTOR_DIR: str = "data/vectors"
+    LOCAL_VECTOR_DTYPE: str = "float16"  # float16 halves memory and disk, float32 keeps full precision
+    LOCAL_ANN_MIN_VECTORS: int = 50_000  # HNSW search above this, exact search below
+    LOCAL_ANN_EF_SEARCH: int = 64  # HNSW recall/speed trade-off
+    VECTOR_COLLECTION_MODE: str = "per_agent"  # per_agent, sharded or shared
+    VECTOR_SHARDS: int = 16  # Collections used in sharded mode
+    VECTOR_GC_INTERVAL: float = 6 * 60 * 60  # Seconds between orphan sweeps, 0 disables
+
     class Config:
         env_file = ".env"
 
@@ -6,6 +6,7 @@ from app.models.user import User  # Import all models
 from app.models.agent import Agent
 from app.models.document import Document
 from app.models.message import Message
+from app.models.conversation_summary import ConversationSummary
 
 logger = logging.getLogger(__name__)
 
@@ -1,16 +1,23 @@
 # backend/app/main.py
 
+import asyncio
 import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from app.core.clients import clients
 from app.core.config import settings
 from app.api.v1 import auth, documents, chat, agents
 from app.db.init_db import create_db_and_tables
-from app.api.v1 import analytics
+from app.api.v1 import analytics, admin
+from app.services.ingestion import ingestion_queue
+from app.services.vector_gc import reconcile_loop
+from app.utils.embedding import shutdown_embedding_pool
+from app.utils.parser import shutdown_parser_pool
 
 logger = logging.getLogger(__name__)
 
 app = FastAPI(title=settings.PROJECT_NAME)
+background_tasks: list[asyncio.Task] = []
 
 @app.on_event("startup")
 async def on_startup():
@@ -18,10 +25,24 @@ async def on_startup():
     try:
         await create_db_and_tables()
         logger.info("Database initialization complete")
+        await clients.startup()
+        await ingestion_queue.start()
+        if settings.VECTOR_GC_INTERVAL > 0:
+            background_tasks.append(asyncio.create_task(reconcile_loop(settings.VECTOR_GC_INTERVAL)))
     except Exception as e:
         logger.error(f"Startup failed: {e}")
         raise
 
+@app.on_event("shutdown")
+async def on_shutdown():
+    logger.info("Shutting down...")
+    for task in background_tasks:
+        task.cancel()
+    await ingestion_queue.stop()
+    shutdown_parser_pool()
+    shutdown_embedding_pool()
+    await clients.shutdown()
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -37,4 +58,5 @@ app.include_router(auth.router, prefix=settings.API_V1_STR)
 app.include_router(documents.router, prefix=settings.API_V1_STR)
 app.include_router(chat.router, prefix=settings.API_V1_STR)
 app.include_router(agents.router, prefix=settings.API_V1_STR)
-app.include_router(analytics.router, prefix=settings.API_V1_STR)
\ No newline at end of file
+app.include_router(analytics.router, prefix=settings.API_V1_STR)
+app.include_router(admin.router, prefix=settings.API_V1_STR)
\ No newline at end of file
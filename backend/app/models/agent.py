@@ -15,6 +15,8 @@ class Agent(SQLModel, table=True):
         "Never make up answers or speculate beyond the document content. "
         "When answering, always cite which document the information came from."
     )
+    content_version: int = 0  # Bumped whenever the agent's documents change
+    context_token_budget: Optional[int] = None  # Prompt tokens, CONTEXT_TOKEN_BUDGET when unset
     owner_id: UUID = Field(foreign_key="user.id")
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
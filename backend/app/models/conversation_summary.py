@@ -0,0 +1,13 @@
+# app/models/conversation_summary.py
+
+from sqlmodel import SQLModel, Field
+from uuid import UUID
+from datetime import datetime
+from typing import Optional
+
+class ConversationSummary(SQLModel, table=True):
+    agent_id: UUID = Field(primary_key=True)
+    summary: str = ""
+    summarized_until: Optional[datetime] = None  # created_at of the newest message folded into the summary
+    summarized_messages: int = 0
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
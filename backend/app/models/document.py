@@ -2,6 +2,15 @@
 from sqlmodel import SQLModel, Field
 from uuid import uuid4, UUID
 from datetime import datetime
+from enum import Enum
+from typing import Optional
+
+class DocumentStatus(str, Enum):
+    QUEUED = "queued"
+    PARSING = "parsing"
+    EMBEDDING = "embedding"
+    DONE = "done"
+    FAILED = "failed"
 
 class Document(SQLModel, table=True):
     id: UUID = Field(default_factory=uuid4, primary_key=True)
@@ -9,7 +18,13 @@ class Document(SQLModel, table=True):
     filename: str
     content_type: str
     uploaded_at: datetime = Field(default_factory=datetime.utcnow)
+    content_hash: Optional[str] = Field(default=None, index=True)  # sha256 of the uploaded bytes
+    size_bytes: Optional[int] = None
+    revision: int = 1  # Bumped every time the document is replaced
 
-
-
-
+    # Ingestion job state
+    status: DocumentStatus = Field(default=DocumentStatus.QUEUED)
+    chunks_total: int = 0
+    chunks_done: int = 0
+    error: Optional[str] = None
+    processed_at: Optional[datetime] = None
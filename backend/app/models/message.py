@@ -1,5 +1,6 @@
 # app/models/message.py
 
+from sqlalchemy import Column, JSON
 from sqlmodel import SQLModel, Field
 from uuid import UUID, uuid4
 from datetime import datetime
@@ -10,4 +11,10 @@ class Message(SQLModel, table=True):
     agent_id: UUID
     content: str
     is_user: bool
+    response_time: Optional[float] = None  # Seconds to answer, set on AI messages
+    cached: bool = False  # AI message served from the answer cache
+    prompt_tokens: Optional[int] = None  # Evaluated by the model server; tokens served from its prompt cache are not counted
+    prompt_tokens_estimate: Optional[int] = None  # Size of the whole prompt as packed, cached part included
+    completion_tokens: Optional[int] = None
+    timings: Optional[dict] = Field(default=None, sa_column=Column(JSON))  # Seconds per chat-turn stage
     created_at: datetime = Field(default_factory=datetime.utcnow)
\ No newline at end of file
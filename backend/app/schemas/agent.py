@@ -2,6 +2,7 @@
 from pydantic import BaseModel, Field, validator
 from uuid import UUID
 from datetime import datetime
+from typing import Optional
 
 class AgentCreate(BaseModel):
     name: str = Field(..., min_length=3, max_length=100)
@@ -16,6 +17,7 @@ class AgentCreate(BaseModel):
         ),
         max_length=2000
     )
+    context_token_budget: Optional[int] = Field(default=None, ge=512, le=128_000)
 
     @validator('instructions')
     def validate_instructions(cls, v):
@@ -28,6 +30,7 @@ class AgentOut(BaseModel):
     name: str
     description: str
     instructions: str
+    context_token_budget: Optional[int]
     created_at: datetime
     updated_at: datetime
 
@@ -3,12 +3,41 @@
 from pydantic import BaseModel
 from uuid import UUID
 from datetime import datetime
+from typing import Optional
+from app.models.document import DocumentStatus
 
 class DocumentResponse(BaseModel):
     id: UUID
     filename: str
     content_type: str
     uploaded_at: datetime
+    revision: int = 1
+    status: DocumentStatus
+    chunks_total: int = 0
+    chunks_done: int = 0
 
     class Config:
         orm_mode = True
+
+class DocumentStatusResponse(BaseModel):
+    id: UUID
+    status: DocumentStatus
+    chunks_total: int
+    chunks_done: int
+    error: Optional[str] = None
+    processed_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+class BulkUploadItem(BaseModel):
+    filename: str
+    status: str  # queued, duplicate or error
+    document_id: Optional[UUID] = None
+    detail: Optional[str] = None
+
+class BulkUploadResponse(BaseModel):
+    queued: int
+    duplicates: int
+    failed: int
+    items: list[BulkUploadItem]
@@ -0,0 +1,92 @@
+# app/scripts/migrate_vectors.py
+"""Move chunks from the shared agent_store collection into routed collections.
+
+Run once after switching VECTOR_COLLECTION_MODE away from "shared":
+
+    python -m app.scripts.migrate_vectors [--dry-run] [--batch-size 500]
+
+Vectors are copied with their stored embeddings, so nothing is re-embedded.
+Each batch is deleted from the source only after it was written to its
+target collection, which makes the migration safe to interrupt and re-run.
+"""
+import argparse
+import logging
+from collections import defaultdict
+
+from app.core.config import settings
+from app.utils.vectorstore import (
+    COLLECTION_NAME,
+    collection_name,
+    drop_collection,
+    get_vectorstore,
+    list_collection_names,
+)
+
+logger = logging.getLogger(__name__)
+
+def owner_agent_id(agent_id: str) -> str:
+    """Strip the staged:/retired: markers to find the agent a chunk belongs to"""
+    return agent_id.split(":", 1)[1] if ":" in agent_id else agent_id
+
+def migrate(batch_size: int, dry_run: bool) -> dict:
+    if settings.VECTOR_COLLECTION_MODE == "shared":
+        raise SystemExit("VECTOR_COLLECTION_MODE is 'shared', nothing to migrate")
+
+    if COLLECTION_NAME not in list_collection_names():
+        logger.info(f"No {COLLECTION_NAME} collection found, nothing to migrate")
+        return {"moved": 0, "skipped": 0, "collections": 0}
+
+    source = get_vectorstore(name=COLLECTION_NAME)
+    moved = skipped = offset = 0
+    targets = set()
+    while True:
+        page = source.get(
+            include=["embeddings", "metadatas", "documents"],
+            limit=batch_size,
+            # Migrated rows are deleted, so the next page always starts at 0
+            offset=offset if dry_run else 0
+        )
+        if not page["ids"]:
+            break
+
+        grouped = defaultdict(lambda: {"ids": [], "embeddings": [], "metadatas": [], "documents": []})
+        done_ids = []
+        for i, vector_id in enumerate(page["ids"]):
+            metadata = page["metadatas"][i] or {}
+            agent_id = metadata.get("agent_id")
+            done_ids.append(vector_id)
+            if not agent_id or agent_id.startswith("retired:"):
+                skipped += 1
+                continue
+            group = grouped[collection_name(owner_agent_id(agent_id))]
+            group["ids"].append(vector_id)
+            group["embeddings"].append(page["embeddings"][i])
+            group["metadatas"].append(metadata)
+            group["documents"].append(page["documents"][i])
+
+        for name, group in grouped.items():
+            targets.add(name)
+            moved += len(group["ids"])
+            if not dry_run:
+                get_vectorstore(name=name).upsert(**group)
+        if not dry_run:
+            source.delete(ids=done_ids)
+        offset += len(page["ids"])
+        logger.info(f"Migrated {moved} vectors into {len(targets)} collections ({skipped} skipped)")
+
+    if not dry_run and source.count() == 0:
+        drop_collection(COLLECTION_NAME)
+    return {"moved": moved, "skipped": skipped, "collections": len(targets)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="Report what would move without writing")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    report = migrate(args.batch_size, args.dry_run)
+    print(report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# backend/app/services/answer_cache.py
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.utils.query_cache import normalize_query
+
+class CachedAnswer(NamedTuple):
+    answer: str
+    expires: float
+    embedding: Optional[np.ndarray]
+
+class AnswerCache:
+    """Per-agent cache of generated answers keyed by normalized query text.
+
+    In semantic mode a miss on the exact key falls back to the cached
+    question whose embedding has the highest cosine similarity, if it is at
+    least similarity_threshold. Entries are tagged with the agent's content
+    version; a lookup or store with a newer version drops everything cached
+    for the agent. invalidate() covers changes that do not bump the version,
+    such as new instructions.
+    """
+
+    def __init__(self, mode: str, max_entries_per_agent: int, ttl: float, similarity_threshold: float):
+        if mode not in ("exact", "semantic", "off"):
+            raise ValueError(f"Unknown ANSWER_CACHE_MODE: {mode}")
+        self.mode = mode
+        self.enabled = mode != "off"
+        self.semantic = mode == "semantic"
+        self.max_entries_per_agent = max_entries_per_agent
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._agents: dict[str, OrderedDict[str, CachedAnswer]] = {}
+        self._versions: dict[str, int] = {}
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _unit(embedding: list[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _entries(self, agent_id: str, version: int) -> Optional[OrderedDict]:
+        """The agent's entries if they belong to this content version"""
+        current = self._versions.get(agent_id)
+        if current is None or version > current:
+            self.invalidate(agent_id)
+            self._versions[agent_id] = version
+            return self._agents.setdefault(agent_id, OrderedDict())
+        if version < current:
+            return None  # Caller read an outdated version
+        return self._agents.setdefault(agent_id, OrderedDict())
+
+    def lookup(
+        self,
+        agent_id: str,
+        version: int,
+        query: str,
+        embedding: Optional[list[float]] = None
+    ) -> Optional[str]:
+        if not self.enabled:
+            return None
+        entries = self._entries(agent_id, version)
+        if entries:
+            now = time.monotonic()
+            key = normalize_query(query)
+            entry = entries.get(key)
+            if entry is not None and entry.expires >= now:
+                entries.move_to_end(key)
+                self.hits += 1
+                return entry.answer
+
+            if self.semantic and embedding is not None:
+                candidates = [(k, e) for k, e in entries.items() if e.embedding is not None and e.expires >= now]
+                if candidates:
+                    matrix = np.stack([e.embedding for _, e in candidates])
+                    scores = matrix @ self._unit(embedding)
+                    best = int(np.argmax(scores))
+                    if scores[best] >= self.similarity_threshold:
+                        entries.move_to_end(candidates[best][0])
+                        self.hits += 1
+                        self.semantic_hits += 1
+                        return candidates[best][1].answer
+        self.misses += 1
+        return None
+
+    def store(
+        self,
+        agent_id: str,
+        version: int,
+        query: str,
+        answer: str,
+        embedding: Optional[list[float]] = None
+    ) -> None:
+        if not self.enabled:
+            return
+        entries = self._entries(agent_id, version)
+        if entries is None:
+            return
+        key = normalize_query(query)
+        entries[key] = CachedAnswer(
+            answer=answer,
+            expires=time.monotonic() + self.ttl,
+            embedding=self._unit(embedding) if self.semantic and embedding is not None else None
+        )
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries_per_agent:
+            entries.popitem(last=False)
+
+    def invalidate(self, agent_id: str) -> None:
+        self._versions.pop(str(agent_id), None)
+        if self._agents.pop(str(agent_id), None):
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "agents": len(self._agents),
+            "entries": sum(len(entries) for entries in self._agents.values()),
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+answer_cache = AnswerCache(
+    mode=settings.ANSWER_CACHE_MODE,
+    max_entries_per_agent=settings.ANSWER_CACHE_SIZE,
+    ttl=settings.ANSWER_CACHE_TTL,
+    similarity_threshold=settings.ANSWER_CACHE_SIMILARITY
+)
@@ -1,42 +1,75 @@
 # backend/app/services/chat.py
 import asyncio
 import json
-from typing import Optional, Callable, Awaitable
-from uuid import UUID
+from typing import Optional, Callable, Awaitable, NamedTuple
+from uuid import UUID, uuid4
 from datetime import datetime
 import time
 import logging
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlmodel import select, func
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import OllamaEmbeddings
+from sqlmodel import select
 from langchain.prompts import PromptTemplate
-from langchain_community.llms import Ollama
 from langchain.chains import RetrievalQA
 
 from app.models.user import User
 from app.models.agent import Agent
 from app.models.message import Message
-from app.models.document import Document
+from app.core.clients import clients
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.services.answer_cache import answer_cache
+from app.services.content_version import content_versions
+from app.services.context import estimate_tokens, pack_context
+from app.services.llm_scheduler import SchedulerBusy, llm_scheduler
+from app.services.memory import conversation_memories
+from app.services.retrieval import embed_query, retrieve
+from app.services.single_flight import single_flight
+from app.utils.query_cache import normalize_query
+from app.utils.timing import StageTimer
 
 logger = logging.getLogger(__name__)
 
+TokenCallback = Callable[[str], Awaitable[None]]
+
+async def emit_token(on_token: Optional[TokenCallback], text: str) -> Optional[TokenCallback]:
+    """Forward text to a stream consumer; returns None once the consumer failed (e.g. disconnected)"""
+    if on_token is None:
+        return None
+    try:
+        await on_token(text)
+        return on_token
+    except Exception as e:
+        logger.info(f"Stopped streaming answer: {str(e)}")
+        return None
+
 async def store_message(
     db: AsyncSession,
     agent_id: UUID,
     user_id: UUID,
     content: str,
     is_user: bool,
-    response_time: Optional[float] = None
+    response_time: Optional[float] = None,
+    cached: bool = False,
+    prompt_tokens: Optional[int] = None,
+    prompt_tokens_estimate: Optional[int] = None,
+    completion_tokens: Optional[int] = None,
+    timings: Optional[dict] = None,
+    message_id: Optional[UUID] = None
 ) -> Message:
     """Store chat message in database with timing"""
     message = Message(
+        id=message_id or uuid4(),
         agent_id=agent_id,
         user_id=user_id,
         content=content,
         is_user=is_user,
         response_time=response_time,
+        cached=cached,
+        prompt_tokens=prompt_tokens,
+        prompt_tokens_estimate=prompt_tokens_estimate,
+        completion_tokens=completion_tokens,
+        timings=timings,
         created_at=datetime.utcnow()
     )
     db.add(message)
@@ -44,24 +77,59 @@ async def store_message(
     await db.refresh(message)
     return message
 
-async def get_chat_history(db: AsyncSession, agent_id: UUID, limit: int = 5) -> list[Message]:
-    """Retrieve recent chat history for an agent"""
-    statement = (
-        select(Message)
-        .where(Message.agent_id == agent_id)
-        .order_by(Message.created_at.desc())
-        .limit(limit)
+async def persist_message(agent_id: UUID, user_id: UUID, content: str, is_user: bool, **fields) -> Message:
+    """store_message in a session of its own, so it can run concurrently with other queries"""
+    async with AsyncSessionLocal() as session:
+        return await store_message(session, agent_id, user_id, content, is_user, **fields)
+
+class AgentPrompt(NamedTuple):
+    """Parts of the prompt that only change when the agent is edited"""
+    version: int  # Agent content version they were built at
+    system: str
+    system_tokens: int
+    context_budget: int
+
+def build_agent_prompt(agent: Agent, version: int) -> AgentPrompt:
+    # Instructions go first and are identical on every turn of every conversation
+    # with this agent: they are sent as the system message so the model server can
+    # reuse the already evaluated prefix instead of re-reading it each turn.
+    # Everything that changes per turn comes after them, least volatile first.
+    system = f"""You are {agent.name}, a specialized AI assistant focused on provided documents.
+
+Role Guidelines:
+- Only answer questions based on the provided context
+- Maintain professional yet friendly tone
+- Greet users warmly but briefly when conversation starts
+- Never speculate or make up answers
+- If unsure, say "I don't have information about that in my documents"
+- For unrelated questions: "I specialize in {agent.name}. I can help with: {agent.name}"
+- Always be concise and factual
+- Never role-play or switch domains
+- When answering:
+   - Be concise but helpful
+   - Cite sources when possible
+   - Use bullet points for complex information"""
+
+    return AgentPrompt(
+        version=version,
+        system=system,
+        system_tokens=estimate_tokens(system),
+        # A budget beyond the model's window would be truncated away by the server
+        context_budget=min(
+            agent.context_token_budget or settings.CONTEXT_TOKEN_BUDGET,
+            settings.LLM_NUM_CTX - settings.LLM_ANSWER_TOKENS
+        )
     )
-    result = await db.execute(statement)
-    messages = result.scalars().all()
-    return sorted(messages, key=lambda x: x.created_at)  # Return in chronological order
 
+async def load_agent(agent_id: UUID) -> Optional[Agent]:
+    async with AsyncSessionLocal() as session:
+        return await session.get(Agent, agent_id)
 
 async def get_qa_chain(
     agent_id: UUID,
     db: AsyncSession,
     user_id: UUID
-) -> Callable[[str], Awaitable[str]]:
+) -> Callable[..., Awaitable[str]]:
     """Create and return an async QA chain with strict context enforcement"""
     try:
         agent_result = await db.execute(
@@ -73,45 +141,8 @@ async def get_qa_chain(
         if not agent:
             raise ValueError("Agent not found or access denied")
 
-        # Get document count to check if any documents are uploaded
-        doc_count = await db.execute(
-            select(func.count(Document.id))
-            .where(Document.agent_id == agent_id)
-        )
-        has_documents = doc_count.scalar() > 0
-
-        # Initialize vectorstore for document retrieval
-        vectorstore = Chroma(
-            collection_name="agent_store",
-            embedding_function=OllamaEmbeddings(
-                model="llama3",
-                base_url="http://backend-ollama-1:11434"
-            ),
-        ).as_retriever(
-            search_kwargs={
-                "k": 5,
-                "filter": {'agent_id': str(agent_id)}
-            }
-        )
-
-        # Enhanced prompt template with strict context control
-        prompt_template = """You are {agent_name}, a specialized AI assistant focused on provided documents.
 
-Role Guidelines:
-- Only answer questions based on the provided context
-- Maintain professional yet friendly tone
-- Greet users warmly but briefly when conversation starts
-- Never speculate or make up answers
-- If unsure, say "I don't have information about that in my documents"
-- For unrelated questions: "I specialize in {agent_name}. I can help with: {agent_name}"
-- Always be concise and factual
-- Never role-play or switch domains
-- When answering:
-   - Be concise but helpful
-   - Cite sources when possible
-   - Use bullet points for complex information
-
-Current conversation:
+        prompt_template = """{summary}Current conversation:
 {history}
 
 Relevant context from documents:
@@ -119,50 +150,178 @@ Relevant context from documents:
 
 Question: {query}
 
-Strictly follow these rules when responding:"""
-        
+Strictly follow the role guidelines when responding:"""
+
         prompt = PromptTemplate(
             template=prompt_template,
-            input_variables=["agent_name", "history", "context", "query"]
-        )
-
-        llm = Ollama(
-            model="llama3",
-            base_url="http://backend-ollama-1:11434",
-            temperature=0.2,  # Lower temperature for more focused responses
-            top_p=0.85,
-            top_k=40,
-            repeat_penalty=1.2
+            input_variables=["summary", "history", "context", "query"]
         )
-
-        async def custom_qa_chain(inputs: dict) -> str:
-            """Custom chain with strict context enforcement"""
-            if not has_documents:
-                return ("I'm configured to answer based on documents, but no documents have been uploaded yet. "
-                       "Please upload relevant documents first.")
-
-            docs = await vectorstore.ainvoke(inputs["query"])
+        agent_prompt = build_agent_prompt(agent, agent.content_version)
+
+        # Kept the same for every request: different load-time options (e.g. num_ctx)
+        # make the server reload the model and lose its prompt cache
+        llm_options = {
+            "temperature": 0.2,  # Lower temperature for more focused responses
+            "top_p": 0.85,
+            "top_k": 40,
+            "repeat_penalty": 1.2,
+            "num_ctx": settings.LLM_NUM_CTX  # Without it the server's default window cuts the prompt from the front
+        }
+
+        async def custom_qa_chain(
+            inputs: dict,
+            timer: StageTimer,
+            on_token: Optional[TokenCallback] = None
+        ) -> tuple[str, dict]:
+            """Custom chain with strict context enforcement, returns the answer and token usage"""
+            docs = inputs["docs"]
             if not docs:
-                return "I don't have information about that in my documents."
-
-            context = "\n\n".join(
-                f"From {doc.metadata.get('filename', 'document')}:\n{doc.page_content}" 
-                for doc in docs
-            )
+                return "I don't have information about that in my documents.", {}
+
+            with timer.stage("pack_context"):
+                # Instructions, conversation summary and question are always sent,
+                # chunks and recent history share the rest
+                summary = inputs["summary"]
+                fixed_tokens = agent_prompt.system_tokens + estimate_tokens(await prompt.aformat(
+                    summary=summary,
+                    history="",
+                    query=inputs["query"],
+                    context=""
+                ))
+                packed = pack_context(
+                    docs,
+                    inputs["history"],
+                    agent_prompt.context_budget - fixed_tokens,
+                    settings.CONTEXT_HISTORY_SHARE
+                )
+                formatted_prompt = await prompt.aformat(
+                    summary=summary,
+                    history=packed.history,
+                    query=inputs["query"],
+                    context=packed.context
+                )
 
-            formatted_prompt = await prompt.aformat(
-                agent_name=inputs["agent_name"],
-                history=inputs["history"],
-                query=inputs["query"],
-                context=context
+            # Generation slots are shared fairly between the owners of all agents
+            async with llm_scheduler.slot(str(agent.owner_id)) as waited:
+                timer.timings["llm_queue"] = round(waited, 4)
+                if on_token is None:
+                    result = await timer.run(
+                        "generate",
+                        clients.ollama.agenerate_full(settings.LLM_MODEL, formatted_prompt, llm_options, agent_prompt.system)
+                    )
+                else:
+                    # Tokens are forwarded as they arrive; a consumer that goes away does
+                    # not stop generation, so the full answer is still stored
+                    parts, result = [], {}
+                    with timer.stage("generate"):
+                        async for chunk in clients.ollama.astream_generate(
+                            settings.LLM_MODEL, formatted_prompt, llm_options, agent_prompt.system
+                        ):
+                            piece = chunk.get("response", "")
+                            if piece:
+                                if not parts:
+                                    timer.mark("first_token")
+                                parts.append(piece)
+                                on_token = await emit_token(on_token, piece)
+                            if chunk.get("done"):
+                                result = chunk
+                    result = {**result, "response": "".join(parts)}
+
+            if result.get("prompt_eval_duration") is not None:
+                # Only the part of the prompt not found in the server's prompt cache is evaluated
+                timer.timings["prefill"] = round(result["prompt_eval_duration"] / 1e9, 4)
+            usage = {
+                "prompt_tokens": result.get("prompt_eval_count"),
+                "prompt_tokens_estimate": fixed_tokens + packed.history_tokens + packed.context_tokens,
+                "completion_tokens": result.get("eval_count"),
+            }
+            logger.debug(
+                f"Prompt for agent {agent_id}: ~{usage['prompt_tokens_estimate']} estimated / "
+                f"{usage['prompt_tokens']} evaluated (uncached) tokens, {packed.chunks_used}/{len(docs)} chunks"
             )
+            return str(result["response"]), usage
+
+        async def answer(
+            query: str,
+            timer: StageTimer,
+            turn_started: datetime,
+            on_token: Optional[TokenCallback] = None
+        ) -> tuple[str, dict]:
+            """Answer and extra message fields for one question"""
+            nonlocal agent, agent_prompt
+            # Checked every turn, so documents uploaded during the connection are seen
+            content = await timer.run("content_version", content_versions.get(agent_id))
+            if content.version != agent_prompt.version:
+                # The agent may have been edited (which bumps the version), possibly by
+                # another process; answers must not be built from its old prompt
+                current = await timer.run("load_agent", load_agent(agent_id))
+                if current is not None:
+                    agent = current
+                agent_prompt = build_agent_prompt(agent, content.version)
+            if not content.has_documents:
+                return ("I'm configured to answer based on documents, but no documents have been uploaded yet. "
+                       "Please upload relevant documents first."), {}
+
+            # Repeated questions are answered from the cache without retrieval or generation
+            query_embedding = None
+            if answer_cache.enabled:
+                if answer_cache.semantic:
+                    query_embedding = await timer.run("embed_query", embed_query(query))
+                with timer.stage("answer_cache"):
+                    cached_response = answer_cache.lookup(str(agent_id), content.version, query, query_embedding)
+                if cached_response is not None:
+                    return cached_response, {"cached": True}
+
+            async def generate(publish: TokenCallback) -> tuple[str, dict]:
+                # History and retrieval do not depend on each other
+                memory, docs = await asyncio.gather(
+                    timer.run("load_history", conversation_memories.load(agent_id, before=turn_started)),
+                    timer.run("retrieve", retrieve(str(agent_id), query, k=5, version=content.version))
+                )
 
-            response = await llm.ainvoke(formatted_prompt)
-            return str(response)
-
-        async def wrapped_chain(question: str) -> str:
-            """Enhanced chain with message persistence and strict context control"""
-            start_time = time.time()
+                inputs = {
+                    "summary": memory.earlier(),
+                    "history": memory.recent,
+                    "docs": docs,
+                    "query": query
+                }
+                # Always streamed into the flight: whoever joins it may want the tokens,
+                # not just the request that started it
+                response, usage = await custom_qa_chain(inputs, timer, publish)
+                answer_cache.store(str(agent_id), content.version, query, response, query_embedding)
+                return response, usage
+
+            # The same question asked while it is still being answered shares that
+            # answer (and its token stream) instead of retrieving and generating again
+            key = (str(agent_id), content.version, normalize_query(query))
+            with timer.stage("single_flight"):
+                (response, usage), shared = await single_flight.run(key, generate, on_token)
+            if shared:
+                # Generation was paid for by the first request
+                return response, {}
+            return response, usage
+
+        async def wrapped_chain(
+            question: str,
+            on_token: Optional[TokenCallback] = None,
+            message_id: Optional[UUID] = None
+        ) -> str:
+            """Chat turn with message persistence; independent stages run concurrently and are timed.
+
+            With on_token the answer is streamed: generated tokens are passed
+            on as they arrive, answers that are not generated (cache hits,
+            fixed replies) in one piece. The AI message is stored under
+            message_id when given.
+            """
+            timer = StageTimer()
+            streamed = False
+
+            async def forward(text: str) -> None:
+                nonlocal streamed
+                streamed = True
+                await on_token(text)
+
+            turn_started = datetime.utcnow()
             try:
                 try:
                     message_data = json.loads(question)
@@ -170,33 +329,36 @@ Strictly follow these rules when responding:"""
                 except json.JSONDecodeError:
                     query = question
 
-                await store_message(db, agent_id, user_id, query, True)
-
-                history_messages = await get_chat_history(db, agent_id)
-                history_str = "\n".join(
-                    f"{'User' if m.is_user else 'AI'}: {m.content}"
-                    for m in history_messages
+                # The question is stored in its own session while the answer is prepared
+                user_message = asyncio.create_task(
+                    timer.run("store_user_message", persist_message(agent_id, user_id, query, True))
                 )
+                try:
+                    response, fields = await answer(query, timer, turn_started, forward if on_token else None)
+                finally:
+                    await asyncio.gather(user_message, return_exceptions=True)
+                user_message.result()
+                if on_token and not streamed:
+                    await emit_token(on_token, response)
 
-                inputs = {
-                    "agent_name": agent.name,
-                    "history": history_str,
-                    "query": query
-                }
-
-                response = await custom_qa_chain(inputs)
-
-                response_time = time.time() - start_time
                 await store_message(
                     db,
                     agent_id,
                     user_id,
                     response,
                     False,
-                    response_time
+                    timer.elapsed(),
+                    timings=timer.report(),
+                    message_id=message_id,
+                    **fields
                 )
+                # Turns that left the recent window are summarized after the reply is out
+                conversation_memories.schedule_refresh(agent_id, str(agent.owner_id))
                 return response
 
+            except SchedulerBusy:
+                # Shed before generating; the question is kept, there is no answer to store
+                raise
             except Exception as e:
                 await db.rollback()
                 error_msg = f"Error processing question: {str(e)}"
@@ -206,7 +368,9 @@ Strictly follow these rules when responding:"""
                     user_id,
                     error_msg,
                     False,
-                    time.time() - start_time
+                    timer.elapsed(),
+                    timings=timer.report(),
+                    message_id=message_id
                 )
                 raise ValueError(error_msg) from e
 
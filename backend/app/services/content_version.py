@@ -0,0 +1,74 @@
+# backend/app/services/content_version.py
+import logging
+import time
+from typing import NamedTuple
+from uuid import UUID
+
+from sqlmodel import select, update
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.agent import Agent
+from app.models.document import Document
+
+logger = logging.getLogger(__name__)
+
+class ContentState(NamedTuple):
+    version: int
+    has_documents: bool
+
+class ContentVersions:
+    """Per-agent content version and document presence, cached in-process.
+
+    Agent.content_version is incremented in the database whenever the
+    agent's documents change (upload, delete, finished ingestion), so it is
+    monotonic across worker processes and can key caches of anything
+    derived from the documents. Reads are served from memory; an entry is
+    re-read after ttl seconds, which bounds how long a change made by
+    another process goes unnoticed. Changes made by this process are seen
+    immediately.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: dict[str, tuple[float, ContentState]] = {}
+        self.loads = 0
+
+    async def get(self, agent_id: UUID) -> ContentState:
+        key = str(agent_id)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        async with AsyncSessionLocal() as session:
+            state = await self._load(session, agent_id)
+        self._entries[key] = (time.monotonic() + self.ttl, state)
+        return state
+
+    async def _load(self, session, agent_id: UUID) -> ContentState:
+        self.loads += 1
+        has_documents = select(Document.id).where(Document.agent_id == agent_id).exists()
+        result = await session.execute(select(Agent.content_version, has_documents).where(Agent.id == agent_id))
+        row = result.first()
+        return ContentState(version=row[0], has_documents=bool(row[1])) if row else ContentState(0, False)
+
+    async def bump(self, agent_id: UUID) -> int:
+        """Increment the agent's content version and return the new value"""
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(Agent)
+                .where(Agent.id == agent_id)
+                .values(content_version=Agent.content_version + 1)
+            )
+            await session.commit()
+            state = await self._load(session, agent_id)
+        self._entries[str(agent_id)] = (time.monotonic() + self.ttl, state)
+        logger.debug(f"Content version of agent {agent_id} is now {state.version}")
+        return state.version
+
+    def forget(self, agent_id: UUID) -> None:
+        self._entries.pop(str(agent_id), None)
+
+    def stats(self) -> dict:
+        return {"agents": len(self._entries), "loads": self.loads}
+
+content_versions = ContentVersions(ttl=settings.CONTENT_VERSION_TTL)
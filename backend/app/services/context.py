@@ -0,0 +1,107 @@
+# backend/app/services/context.py
+import math
+import re
+from typing import NamedTuple
+
+from langchain.schema import Document as LC_Document
+
+from app.models.message import Message
+
+TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+MIN_TRUNCATED_TOKENS = 32  # Smaller leftovers are dropped rather than truncated
+
+def estimate_tokens(text: str) -> int:
+    """Approximate BPE token count: words and punctuation marks, plus a third for sub-word splits.
+
+    Never less than one token per four characters, so long unbroken runs
+    (hashes, base64, identifiers) are not counted as a single word.
+    """
+    return max(math.ceil(len(TOKEN_RE.findall(text)) * 4 / 3), len(text) // 4)
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Longest prefix ending at a sentence or line break within max_tokens; cut at a word if there is none"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    cut = start = used = 0
+    for match in SENTENCE_END_RE.finditer(text):
+        used += estimate_tokens(text[start:match.start()])
+        if used > max_tokens:
+            break
+        cut, start = match.start(), match.end()
+    if cut:
+        return text[:cut]
+    # Within max_tokens by length; long unbroken runs (e.g. an encoded blob) are cut here
+    words = text[:max_tokens * 4].split()
+    while len(words) > 1 and estimate_tokens(" ".join(words)) > max_tokens:
+        words = words[:len(words) * max_tokens // estimate_tokens(" ".join(words)) or 1]
+    return " ".join(words) + " ..."
+
+class PackedContext(NamedTuple):
+    history: str
+    context: str
+    history_tokens: int
+    context_tokens: int
+    chunks_used: int
+
+def format_chunk(doc: LC_Document) -> str:
+    return f"From {doc.metadata.get('filename', 'document')}:\n{doc.page_content}"
+
+def format_message(message: Message) -> str:
+    return f"{'User' if message.is_user else 'AI'}: {message.content}"
+
+def pack_context(
+    docs: list[LC_Document],
+    history: list[Message],
+    budget: int,
+    history_share: float
+) -> PackedContext:
+    """Fit retrieved chunks and chat history into a token budget.
+
+    budget is what remains after the instructions and the question. History
+    may take up to history_share of it (newest messages first); chunks are
+    added in relevance order and the first one that does not fit is cut at
+    a sentence boundary. Whatever the chunks leave unused goes back to the
+    history.
+    """
+    budget = max(budget, 0)
+    history_texts = [format_message(m) for m in history]
+    history_needed = sum(estimate_tokens(t) for t in history_texts)
+    context_budget = budget - min(history_needed, int(budget * history_share))
+
+    chunks, context_tokens = [], 0
+    for doc in docs:
+        text = format_chunk(doc)
+        cost = estimate_tokens(text)
+        remaining = context_budget - context_tokens
+        if cost > remaining:
+            if remaining >= MIN_TRUNCATED_TOKENS:
+                text = truncate_to_tokens(text, remaining)
+                if text:
+                    chunks.append(text)
+                    context_tokens += estimate_tokens(text)
+            break
+        chunks.append(text)
+        context_tokens += cost
+
+    kept, history_tokens = [], 0
+    for text in reversed(history_texts):
+        remaining = budget - context_tokens - history_tokens
+        cost = estimate_tokens(text)
+        if cost > remaining:
+            # A long newest message is shortened rather than losing the whole history
+            if not kept and remaining >= MIN_TRUNCATED_TOKENS:
+                text = truncate_to_tokens(text, remaining)
+                kept.append(text)
+                history_tokens += estimate_tokens(text)
+            break
+        kept.append(text)
+        history_tokens += cost
+
+    return PackedContext(
+        history="\n".join(reversed(kept)),
+        context="\n\n".join(chunks),
+        history_tokens=history_tokens,
+        context_tokens=context_tokens,
+        chunks_used=len(chunks)
+    )
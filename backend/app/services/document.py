@@ -1,22 +1,73 @@
 import os
-import uuid
-from tempfile import NamedTemporaryFile
-from shutil import copyfileobj
+import asyncio
+import hashlib
+import mimetypes
+import tarfile
+import tempfile
+import zipfile
+import aiofiles.os
+from aiofiles.tempfile import NamedTemporaryFile
+from typing import IO, NamedTuple, Optional
+from uuid import UUID
 from fastapi import UploadFile, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select
-from app.utils.parser import extract_text
-from app.utils.chunker import chunk_text
-from app.utils.embedding import embed_chunks
-from app.models.document import Document
+from app.core.config import settings
+from app.models.document import Document, DocumentStatus
 from app.models.agent import Agent
+from app.services.content_version import content_versions
+from app.services.ingestion import ingestion_queue, IngestionJob, IngestionQueueFull
+from app.utils.parser import SUPPORTED_TYPES
 import logging
 
 logger = logging.getLogger(__name__)
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2")
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds MAX_UPLOAD_BYTES"""
+    pass
+
+class BulkTooLarge(UploadTooLarge):
+    """Raised when the files of a bulk request exceed MAX_BULK_BYTES in total"""
+    pass
+
+class UnsupportedFileType(Exception):
+    """Raised when an upload's content type cannot be parsed"""
+    pass
+
+class SavedUpload(NamedTuple):
+    path: str
+    sha256: str
+    size: int
+
+class BulkFile(NamedTuple):
+    filename: str
+    content_type: Optional[str]
+    saved: Optional[SavedUpload]
+    error: Optional[str] = None
+
+async def find_duplicate(db: AsyncSession, agent_id: str, content_hash: str):
+    """Return a document of this agent with identical content that has not failed"""
+    result = await db.execute(
+        select(Document).where(
+            Document.agent_id == agent_id,
+            Document.content_hash == content_hash,
+            Document.status != DocumentStatus.FAILED
+        )
+    )
+    return result.scalars().first()
 
 async def process_document(agent_id: str, file: UploadFile, db: AsyncSession) -> Document:
+    """Save the upload and queue it for background ingestion.
+
+    The returned document's id doubles as the ingestion job id; its status
+    moves through queued/parsing/embedding/done/failed as workers progress.
+    If the agent already has a document with the same content, that document
+    is returned and nothing is re-ingested.
+    """
+    saved = None
     try:
         # Verify agent exists
         result = await db.execute(select(Agent).where(Agent.id == agent_id))
@@ -24,51 +75,348 @@ async def process_document(agent_id: str, file: UploadFile, db: AsyncSession) ->
         if not agent:
             raise HTTPException(status_code=404, detail="Agent not found")
 
-        # Save temporary file
-        path = save_upload_temp(file)
-        logger.info(f"Saved temporary file at {path}")
+        if file.content_type not in SUPPORTED_TYPES:
+            raise UnsupportedFileType(f"Unsupported file type: {file.content_type}")
+
+        if ingestion_queue.full():
+            raise IngestionQueueFull("Ingestion queue is full, try again later")
 
-        # Extract and process text
-        text = extract_text(path, file.content_type)
-        if not text:
-            raise ValueError("No text content extracted from file")
-            
-        chunks = chunk_text(text)
-        doc_id = str(uuid.uuid4())
+        # Save temporary file
+        saved = await save_upload_temp(file)
+        logger.info(f"Saved temporary file at {saved.path} ({saved.size} bytes)")
 
-        # Store embeddings
-        embed_chunks(chunks, doc_id=doc_id, agent_id=agent_id)
+        duplicate = await find_duplicate(db, agent_id, saved.sha256)
+        if duplicate:
+            logger.info(f"Upload {file.filename} duplicates document {duplicate.id}, skipping ingestion")
+            await discard_upload(saved.path)
+            return duplicate
 
         # Create document record
         doc = Document(
-            id=doc_id,
             filename=file.filename,
             content_type=file.content_type,
-            agent_id=agent_id
+            agent_id=agent_id,
+            content_hash=saved.sha256,
+            size_bytes=saved.size
         )
         db.add(doc)
         await db.commit()
         await db.refresh(doc)
-        
-        # Clean up temp file
-        try:
-            os.unlink(path)
-        except Exception as e:
-            logger.warning(f"Failed to delete temp file {path}: {str(e)}")
 
+        try:
+            ingestion_queue.submit(IngestionJob(
+                doc_id=doc.id,
+                agent_id=doc.agent_id,
+                path=saved.path,
+                content_type=doc.content_type
+            ))
+        except IngestionQueueFull:
+            await db.delete(doc)
+            await db.commit()
+            raise
+        # No chunks exist yet, the worker bumps the content version once they do;
+        # has_documents must be re-read though
+        content_versions.forget(doc.agent_id)
         return doc
     except Exception as e:
         await db.rollback()
+        if saved:
+            await discard_upload(saved.path)
         logger.error(f"Error in process_document: {str(e)}", exc_info=True)
         raise
 
-def save_upload_temp(file: UploadFile) -> str:
+async def replace_document(document_id: UUID, file: UploadFile, db: AsyncSession) -> Document:
+    """Queue a new revision of an existing document for incremental re-ingestion.
+
+    Only chunks that are not already stored for the document get embedded;
+    the worker then swaps the revision in atomically for readers.
+    """
+    saved = None
     try:
-        suffix = os.path.splitext(file.filename)[1]
-        with NamedTemporaryFile(delete=False, dir=UPLOAD_DIR, suffix=suffix) as tmp:
-            copyfileobj(file.file, tmp)
-            return tmp.name
+        doc = await db.get(Document, document_id)
+        if not doc:
+            raise HTTPException(status_code=404, detail="Document not found")
+        if doc.status in (DocumentStatus.QUEUED, DocumentStatus.PARSING, DocumentStatus.EMBEDDING):
+            raise HTTPException(status_code=409, detail="Document is still being ingested")
+        if file.content_type not in SUPPORTED_TYPES:
+            raise UnsupportedFileType(f"Unsupported file type: {file.content_type}")
+
+        if ingestion_queue.full():
+            raise IngestionQueueFull("Ingestion queue is full, try again later")
+
+        saved = await save_upload_temp(file)
+        if saved.sha256 == doc.content_hash and doc.status == DocumentStatus.DONE:
+            logger.info(f"Replacement for document {doc.id} is unchanged, skipping ingestion")
+            await discard_upload(saved.path)
+            return doc
+
+        doc.filename = file.filename
+        doc.content_type = file.content_type
+        doc.content_hash = saved.sha256
+        doc.size_bytes = saved.size
+        doc.revision += 1
+        doc.status = DocumentStatus.QUEUED
+        doc.chunks_done = doc.chunks_total = 0
+        doc.error = None
+        doc.processed_at = None
+        await db.commit()
+        await db.refresh(doc)
+
+        try:
+            ingestion_queue.submit(IngestionJob(
+                doc_id=doc.id,
+                agent_id=doc.agent_id,
+                path=saved.path,
+                content_type=doc.content_type,
+                replace=True
+            ))
+        except IngestionQueueFull as e:
+            doc.status = DocumentStatus.FAILED
+            doc.error = str(e)
+            await db.commit()
+            raise
+        return doc
+    except Exception as e:
+        await db.rollback()
+        if saved:
+            await discard_upload(saved.path)
+        logger.error(f"Error in replace_document: {str(e)}", exc_info=True)
+        raise
+
+async def save_upload_temp(file: UploadFile) -> SavedUpload:
+    """Stream an upload to disk in chunks, hashing it and enforcing MAX_UPLOAD_BYTES"""
+    suffix = os.path.splitext(file.filename or "")[1]
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with NamedTemporaryFile(delete=False, dir=UPLOAD_DIR, suffix=suffix) as tmp:
+            path = tmp.name
+            try:
+                while chunk := await file.read(settings.UPLOAD_CHUNK_BYTES):
+                    size += len(chunk)
+                    if size > settings.MAX_UPLOAD_BYTES:
+                        raise UploadTooLarge(
+                            f"File exceeds the {settings.MAX_UPLOAD_BYTES} byte upload limit"
+                        )
+                    digest.update(chunk)
+                    await tmp.write(chunk)
+            except Exception:
+                await discard_upload(path)
+                raise
+        return SavedUpload(path=path, sha256=digest.hexdigest(), size=size)
+    except UploadTooLarge:
+        raise
     except Exception as e:
         raise ValueError(f"Failed to save temporary file: {str(e)}")
 
+async def discard_upload(path: str) -> None:
+    try:
+        await aiofiles.os.remove(path)
+    except Exception as e:
+        logger.warning(f"Failed to delete temp file {path}: {str(e)}")
+
+def _copy_member(src: IO[bytes], suffix: str, budget: int) -> SavedUpload:
+    """Copy an archive member to a temp file, hashing it and enforcing MAX_UPLOAD_BYTES.
+
+    budget is what is left of the request's MAX_BULK_BYTES; BulkTooLarge
+    is raised once the member would exceed it.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(delete=False, dir=UPLOAD_DIR, suffix=suffix) as tmp:
+        try:
+            while chunk := src.read(settings.UPLOAD_CHUNK_BYTES):
+                # Counted on the decompressed stream, so headers cannot lie about the size
+                size += len(chunk)
+                if size > settings.MAX_UPLOAD_BYTES:
+                    raise UploadTooLarge(
+                        f"File exceeds the {settings.MAX_UPLOAD_BYTES} byte upload limit"
+                    )
+                if size > budget:
+                    raise BulkTooLarge(
+                        f"Request exceeds the {settings.MAX_BULK_BYTES} byte limit for all files"
+                    )
+                digest.update(chunk)
+                tmp.write(chunk)
+        except Exception:
+            tmp.close()
+            os.unlink(tmp.name)
+            raise
+    return SavedUpload(path=tmp.name, sha256=digest.hexdigest(), size=size)
+
+def _extract_member(name: str, open_member, budget: int) -> BulkFile:
+    content_type = mimetypes.guess_type(name)[0]
+    if content_type not in SUPPORTED_TYPES:
+        return BulkFile(name, content_type, None, "Unsupported file type")
+    try:
+        with open_member() as src:
+            return BulkFile(name, content_type, _copy_member(src, os.path.splitext(name)[1], budget))
+    except BulkTooLarge:
+        raise
+    except Exception as e:
+        return BulkFile(name, content_type, None, str(e))
+
+def extract_archive(path: str, limit: int, budget: int) -> list[BulkFile]:
+    """Extract the regular files of a zip or tar archive into individual temp files.
+
+    Member names are only used for reporting; contents are written to fresh
+    temp files, so paths inside the archive cannot escape UPLOAD_DIR.
+    Extraction stops after limit files or once budget bytes were written.
+    """
+    files = []
+
+    def extract(name: str, open_member) -> bool:
+        nonlocal budget
+        if len(files) >= limit:
+            files.append(BulkFile(name, None, None, "Too many files in request"))
+            return False
+        try:
+            item = _extract_member(name, open_member, budget)
+        except BulkTooLarge as e:
+            files.append(BulkFile(name, None, None, str(e)))
+            return False
+        files.append(item)
+        if item.saved:
+            budget -= item.saved.size
+        return True
+
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and not extract(info.filename, lambda: archive.open(info)):
+                    break
+    elif tarfile.is_tarfile(path):
+        with tarfile.open(path) as archive:
+            for member in archive:
+                if member.isfile() and not extract(member.name, lambda: archive.extractfile(member)):
+                    break
+    else:
+        raise ValueError("Unrecognised archive format")
+    return files
+
+async def collect_bulk_files(files: list[UploadFile]) -> list[BulkFile]:
+    """Save uploads to disk, expanding archives into their member files"""
+    collected: list[BulkFile] = []
+    budget = settings.MAX_BULK_BYTES
+    for file in files:
+        remaining = settings.MAX_BULK_FILES - len(collected)
+        if remaining <= 0:
+            collected.append(BulkFile(file.filename, file.content_type, None, "Too many files in request"))
+            continue
+        is_archive = (file.filename or "").lower().endswith(ARCHIVE_EXTENSIONS)
+        if not is_archive and file.content_type not in SUPPORTED_TYPES:
+            collected.append(BulkFile(file.filename, file.content_type, None, "Unsupported file type"))
+            continue
+        try:
+            saved = await save_upload_temp(file)
+        except Exception as e:
+            collected.append(BulkFile(file.filename, file.content_type, None, str(e)))
+            continue
+        if not is_archive:
+            if saved.size > budget:
+                await discard_upload(saved.path)
+                collected.append(BulkFile(
+                    file.filename,
+                    file.content_type,
+                    None,
+                    f"Request exceeds the {settings.MAX_BULK_BYTES} byte limit for all files"
+                ))
+                continue
+            budget -= saved.size
+            collected.append(BulkFile(file.filename, file.content_type, saved))
+            continue
+        try:
+            extracted = await asyncio.to_thread(extract_archive, saved.path, remaining, budget)
+            budget -= sum(item.saved.size for item in extracted if item.saved)
+            collected.extend(extracted)
+        except Exception as e:
+            collected.append(BulkFile(file.filename, file.content_type, None, str(e)))
+        finally:
+            await discard_upload(saved.path)
+    return collected
+
+async def process_bulk_upload(agent_id: str, files: list[UploadFile], db: AsyncSession) -> list[dict]:
+    """Save many files (or archives of files) and queue them for ingestion.
+
+    All new Document rows are inserted as queued in one transaction and the
+    jobs are fed to the ingestion workers as the queue drains. Returns one
+    manifest entry per file with status queued, duplicate or error.
+    """
+    result = await db.execute(select(Agent).where(Agent.id == agent_id))
+    if not result.scalar_one_or_none():
+        raise HTTPException(status_code=404, detail="Agent not found")
+
+    if not ingestion_queue.running:
+        raise IngestionQueueFull("Ingestion workers are not running")
+
+    collected = await collect_bulk_files(files)
+    manifest: list[dict] = []
+    pending: list[BulkFile] = []
+    for item in collected:
+        if item.error:
+            manifest.append({"filename": item.filename, "status": "error", "detail": item.error})
+        else:
+            pending.append(item)
+
+    hashes = {item.saved.sha256 for item in pending}
+    existing = {}
+    if hashes:
+        rows = await db.execute(
+            select(Document).where(
+                Document.agent_id == agent_id,
+                Document.content_hash.in_(hashes),
+                Document.status != DocumentStatus.FAILED
+            )
+        )
+        existing = {doc.content_hash: doc.id for doc in rows.scalars().all()}
+
+    accepted: list[tuple[BulkFile, Document]] = []
+    for item in pending:
+        if item.saved.sha256 in existing:
+            manifest.append({
+                "filename": item.filename,
+                "status": "duplicate",
+                "document_id": existing[item.saved.sha256]
+            })
+            await discard_upload(item.saved.path)
+        else:
+            doc = Document(
+                filename=item.filename,
+                content_type=item.content_type,
+                agent_id=agent_id,
+                content_hash=item.saved.sha256,
+                size_bytes=item.saved.size
+            )
+            # Identical files within the same request are ingested once
+            existing[item.saved.sha256] = doc.id
+            accepted.append((item, doc))
+
+    try:
+        db.add_all([doc for _, doc in accepted])
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        for item, _ in accepted:
+            await discard_upload(item.saved.path)
+        raise
+
+    # Every accepted file is queued, however many there are; the jobs are
+    # handed to the workers as they make room rather than rejected
+    ingestion_queue.feed([
+        IngestionJob(
+            doc_id=doc.id,
+            agent_id=doc.agent_id,
+            path=item.saved.path,
+            content_type=doc.content_type
+        )
+        for item, doc in accepted
+    ])
+    manifest.extend(
+        {"filename": item.filename, "status": "queued", "document_id": doc.id}
+        for item, doc in accepted
+    )
+    if accepted:
+        content_versions.forget(agent_id)
 
+    logger.info(f"Bulk upload for agent {agent_id}: {len(accepted)} of {len(collected)} files queued")
+    return manifest
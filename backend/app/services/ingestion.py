@@ -0,0 +1,269 @@
+# backend/app/services/ingestion.py
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import AsyncIterable, AsyncIterator, NamedTuple, Optional
+from uuid import UUID
+
+from sqlmodel import select, update
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.document import Document, DocumentStatus
+from app.services.content_version import content_versions
+from app.services.lexical import lexical_indexes
+from app.utils.parser import aiter_segments
+from app.utils.chunker import aiter_chunks
+from app.utils.embedding import embed_stream
+from app.utils.vectorstore import (
+    chunk_id,
+    delete_vectors,
+    get_ids,
+    get_vectorstore,
+    publish_revision,
+    staged_agent_id,
+)
+
+logger = logging.getLogger(__name__)
+
+class IngestionQueueFull(Exception):
+    """Raised when no more ingestion jobs can be accepted"""
+    pass
+
+class DocumentDeleted(Exception):
+    """Raised when a document was deleted while its ingestion job was pending or running"""
+    pass
+
+class IngestionJob(NamedTuple):
+    doc_id: UUID
+    agent_id: UUID
+    path: str
+    content_type: str
+    replace: bool = False  # Re-ingest an existing document, embedding only changed chunks
+
+async def prepare_chunks(
+    chunks: AsyncIterable[tuple[str, dict]],
+    doc_id: str,
+    existing_ids: set[str],
+    kept: dict[str, dict]
+) -> AsyncIterator[tuple[str, str, dict]]:
+    """Assign content-addressed ids and positions to a chunk stream.
+
+    Duplicate chunks within the document are dropped. Chunks already stored
+    under existing_ids are not yielded; their fresh metadata is collected in
+    kept instead so they can be re-published without being re-embedded.
+    """
+    seen = set()
+    async for text, metadata in chunks:
+        cid = chunk_id(doc_id, text)
+        if cid in seen:
+            continue
+        seen.add(cid)
+        metadata = {**metadata, "chunk_index": len(seen) - 1}
+        if cid in existing_ids:
+            kept[cid] = metadata
+        else:
+            yield cid, text, metadata
+
+async def update_document_status(doc_id: UUID, **values) -> None:
+    """Persist job state on the document row using a dedicated session"""
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(Document).where(Document.id == doc_id).values(**values)
+        )
+        await session.commit()
+
+async def document_exists(doc_id: UUID) -> bool:
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(Document.id).where(Document.id == doc_id))
+        return result.first() is not None
+
+class IngestionQueue:
+    """Bounded queue drained by a fixed pool of ingestion workers.
+
+    Parsing runs in the parser process pool, and splitting and embedding
+    in threads, which keeps the event loop free for chat traffic. Single
+    uploads are rejected when the queue is full; large batches are handed
+    to feed(), which waits for room instead.
+    """
+
+    def __init__(self, workers: int, maxsize: int):
+        self.workers = workers
+        self.maxsize = maxsize
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: list[asyncio.Task] = []
+        self._feeders: set[asyncio.Task] = set()
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [
+            asyncio.create_task(self._worker(i), name=f"ingestion-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"Started {self.workers} ingestion workers")
+
+    async def stop(self) -> None:
+        for task in [*self._feeders, *self._tasks]:
+            task.cancel()
+        await asyncio.gather(*self._feeders, *self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Ingestion workers stopped")
+
+    @property
+    def running(self) -> bool:
+        return self._queue is not None
+
+    def full(self) -> bool:
+        return self._queue is None or self._queue.full()
+
+    def qsize(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def submit(self, job: IngestionJob) -> None:
+        if self._queue is None:
+            raise IngestionQueueFull("Ingestion workers are not running")
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise IngestionQueueFull("Ingestion queue is full, try again later")
+
+    def feed(self, jobs: list[IngestionJob]) -> None:
+        """Queue jobs in the background, each as soon as there is room for it"""
+        if self._queue is None:
+            raise IngestionQueueFull("Ingestion workers are not running")
+        task = asyncio.create_task(self._feed(jobs))
+        self._feeders.add(task)
+        task.add_done_callback(self._feeders.discard)
+
+    async def _feed(self, jobs: list[IngestionJob]) -> None:
+        for i, job in enumerate(jobs):
+            try:
+                await self._queue.put(job)
+            except asyncio.CancelledError:
+                # Shutting down; the documents that were never queued will not be ingested
+                for pending in jobs[i:]:
+                    try:
+                        await update_document_status(
+                            pending.doc_id,
+                            status=DocumentStatus.FAILED,
+                            error="Ingestion was stopped before the document was processed",
+                            processed_at=datetime.utcnow()
+                        )
+                    except Exception:
+                        pass
+                    try:
+                        os.unlink(pending.path)
+                    except OSError:
+                        pass
+                raise
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job = await self._queue.get()
+            deleted = False
+            try:
+                await self._run(job)
+            except DocumentDeleted:
+                # Whatever the job wrote went in after the delete purged the document
+                deleted = True
+                logger.info(f"Document {job.doc_id} was deleted during ingestion, discarding its chunks")
+                try:
+                    await asyncio.to_thread(
+                        delete_vectors,
+                        get_vectorstore(str(job.agent_id)),
+                        where={"doc_id": str(job.doc_id)}
+                    )
+                except Exception as e:
+                    logger.warning(f"Failed to purge chunks of deleted document {job.doc_id}: {str(e)}")
+            except Exception as e:
+                logger.error(f"Ingestion of document {job.doc_id} failed: {str(e)}", exc_info=True)
+                await update_document_status(
+                    job.doc_id,
+                    status=DocumentStatus.FAILED,
+                    error=str(e),
+                    processed_at=datetime.utcnow()
+                )
+            finally:
+                # New (or partially written) chunks can change answers
+                if not deleted:
+                    try:
+                        version = await content_versions.bump(job.agent_id)
+                        await lexical_indexes.refresh_document(str(job.agent_id), str(job.doc_id), version)
+                    except Exception as e:
+                        logger.warning(f"Failed to publish new content of document {job.doc_id}: {str(e)}")
+                self._queue.task_done()
+                try:
+                    os.unlink(job.path)
+                except Exception as e:
+                    logger.warning(f"Failed to delete temp file {job.path}: {str(e)}")
+
+    async def _run(self, job: IngestionJob) -> None:
+        if not await document_exists(job.doc_id):
+            raise DocumentDeleted(str(job.doc_id))
+        await update_document_status(job.doc_id, status=DocumentStatus.PARSING)
+        doc_id, agent_id = str(job.doc_id), str(job.agent_id)
+        vectorstore = get_vectorstore(agent_id)
+        existing_ids = set()
+        if job.replace:
+            existing_ids = set(await asyncio.to_thread(get_ids, vectorstore, {"doc_id": doc_id}))
+        kept: dict[str, dict] = {}
+
+        async def on_progress(done: int, produced: int) -> None:
+            await update_document_status(
+                job.doc_id,
+                status=DocumentStatus.EMBEDDING,
+                chunks_done=done + len(kept),
+                chunks_total=produced + len(kept)
+            )
+
+        # parse -> split -> embed stream through bounded stages, so memory
+        # depends on the embedding batch size rather than the document size
+        chunks = prepare_chunks(
+            aiter_chunks(aiter_segments(job.path, job.content_type)),
+            doc_id,
+            existing_ids,
+            kept
+        )
+        try:
+            stored = await embed_stream(
+                chunks,
+                doc_id=doc_id,
+                agent_id=agent_id,
+                staged=job.replace,
+                on_progress=on_progress
+            )
+            if not stored and not kept:
+                raise ValueError("No text content extracted from file")
+            if not await document_exists(job.doc_id):
+                raise DocumentDeleted(str(job.doc_id))
+            if job.replace:
+                removed = await asyncio.to_thread(
+                    publish_revision, vectorstore, doc_id, agent_id, existing_ids, kept
+                )
+                logger.info(
+                    f"Re-ingested document {job.doc_id}: {stored} new, {len(kept)} unchanged, {removed} removed chunks"
+                )
+        except Exception:
+            if job.replace:
+                # The published revision stays; only the staged one is dropped
+                where = {"$and": [{"doc_id": doc_id}, {"agent_id": staged_agent_id(agent_id)}]}
+            else:
+                # A failed new document has no usable chunks; a re-upload starts over
+                where = {"doc_id": doc_id}
+            await asyncio.to_thread(delete_vectors, vectorstore, where=where)
+            raise
+
+        await update_document_status(
+            job.doc_id,
+            status=DocumentStatus.DONE,
+            chunks_done=stored + len(kept),
+            chunks_total=stored + len(kept),
+            processed_at=datetime.utcnow()
+        )
+        logger.info(f"Ingested document {job.doc_id} ({stored + len(kept)} chunks)")
+
+ingestion_queue = IngestionQueue(
+    workers=settings.INGESTION_WORKERS,
+    maxsize=settings.INGESTION_QUEUE_SIZE
+)
@@ -0,0 +1,114 @@
+# backend/app/services/lexical.py
+import asyncio
+import logging
+from collections import OrderedDict, defaultdict
+from typing import Optional
+
+from app.core.config import settings
+from app.utils.bm25 import BM25Index
+from app.utils.vectorstore import get_vectorstore, iter_chunks
+
+logger = logging.getLogger(__name__)
+
+def _load_chunks(agent_id: str, where: dict) -> list[tuple[str, str, str]]:
+    vectorstore = get_vectorstore(agent_id)
+    return [
+        (cid, text, (metadata or {}).get("doc_id", ""))
+        for cid, text, metadata in iter_chunks(vectorstore, where)
+    ]
+
+class LexicalIndexes:
+    """In-process BM25 indexes of every agent's live chunks.
+
+    An agent's index is built from its vector store collection the first
+    time it is searched, then kept current by refresh_document() and
+    remove_document(). Each index remembers the agent content version it
+    reflects; a search with a newer version (a change made by another
+    process) rebuilds it. At most max_agents indexes are held; the least
+    recently used one is dropped and rebuilt on its next search. Changes
+    made while an index is being built discard the build result, so a
+    stale index is never cached.
+    """
+
+    def __init__(self, max_agents: int):
+        self.max_agents = max_agents
+        self._indexes: OrderedDict[str, BM25Index] = OrderedDict()
+        self._generations: dict[str, int] = defaultdict(int)
+        self._versions: dict[str, int] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        self.builds = 0
+
+    def _current(self, agent_id: str, version: Optional[int]) -> Optional[BM25Index]:
+        index = self._indexes.get(agent_id)
+        if index is not None and version is not None and self._versions.get(agent_id, 0) < version:
+            return None
+        return index
+
+    async def get(self, agent_id: str, version: Optional[int] = None) -> BM25Index:
+        """The agent's index, rebuilt if it reflects an older content version than version"""
+        index = self._current(agent_id, version)
+        if index is not None:
+            self._indexes.move_to_end(agent_id)
+            return index
+
+        lock = self._locks.setdefault(agent_id, asyncio.Lock())
+        async with lock:
+            index = self._current(agent_id, version)
+            if index is not None:
+                return index
+            generation = self._generations[agent_id]
+            index = await asyncio.to_thread(self._build, agent_id)
+            if self._generations[agent_id] == generation:
+                self._indexes[agent_id] = index
+                self._versions[agent_id] = max(version or 0, self._versions.get(agent_id, 0))
+                while len(self._indexes) > self.max_agents:
+                    evicted, _ = self._indexes.popitem(last=False)
+                    self._versions.pop(evicted, None)
+        self._locks.pop(agent_id, None)
+        return index
+
+    def _build(self, agent_id: str) -> BM25Index:
+        index = BM25Index()
+        for cid, text, doc_id in _load_chunks(agent_id, {"agent_id": agent_id}):
+            index.add(cid, text, doc_id)
+        self.builds += 1
+        logger.info(f"Built lexical index for agent {agent_id} ({len(index)} chunks)")
+        return index
+
+    async def refresh_document(self, agent_id: str, doc_id: str, version: int) -> None:
+        """Re-read a document's live chunks after it was ingested or re-ingested"""
+        self._generations[agent_id] += 1
+        if agent_id not in self._indexes:
+            return
+        chunks = await asyncio.to_thread(
+            _load_chunks,
+            agent_id,
+            {"$and": [{"doc_id": doc_id}, {"agent_id": agent_id}]}
+        )
+        index = self._indexes.get(agent_id)
+        if index is not None:
+            index.remove_document(doc_id)
+            for cid, text, _ in chunks:
+                index.add(cid, text, doc_id)
+            self._versions[agent_id] = max(version, self._versions.get(agent_id, 0))
+
+    def remove_document(self, agent_id: str, doc_id: str, version: int) -> None:
+        self._generations[agent_id] += 1
+        index = self._indexes.get(agent_id)
+        if index is not None:
+            index.remove_document(doc_id)
+            self._versions[agent_id] = max(version, self._versions.get(agent_id, 0))
+
+    def drop(self, agent_id: str) -> None:
+        self._generations[agent_id] += 1
+        self._indexes.pop(agent_id, None)
+        self._versions.pop(agent_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "agents": len(self._indexes),
+            "chunks": sum(len(index) for index in self._indexes.values()),
+            "builds": self.builds,
+        }
+
+lexical_indexes = LexicalIndexes(max_agents=settings.LEXICAL_INDEX_MAX_AGENTS)
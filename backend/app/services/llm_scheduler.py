@@ -0,0 +1,115 @@
+# backend/app/services/llm_scheduler.py
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class SchedulerBusy(Exception):
+    """Raised when a generation waited longer than the queue deadline"""
+    pass
+
+class LLMScheduler:
+    """Admission control for generation requests to the model server.
+
+    At most max_concurrency generations run at once. Requests beyond that
+    wait in per-tenant queues served by weighted fair queuing: each request
+    gets a virtual finish tag of max(virtual time, tenant's last tag) +
+    1 / weight and the smallest tag is admitted next. A tenant sending a
+    burst therefore only delays its own requests; other tenants are served
+    in between. A request still waiting after queue_timeout seconds is
+    rejected with SchedulerBusy.
+    """
+
+    def __init__(self, max_concurrency: int, queue_timeout: float, weights: dict[str, float]):
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.weights = weights
+        self._active = 0
+        self._heap: list = []
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._last_tag: dict[str, float] = {}
+        self._depth: dict[str, int] = defaultdict(int)
+        self._waits: deque[float] = deque(maxlen=1000)
+        self.admitted = 0
+        self.shed = 0
+
+    def _dispatch(self) -> None:
+        while self._active < self.max_concurrency and self._heap:
+            tag, _, future, tenant = heapq.heappop(self._heap)
+            if future.done():  # Timed out or cancelled while queued
+                continue
+            self._depth[tenant] -= 1
+            self._virtual_time = tag
+            self._active += 1
+            future.set_result(None)
+
+    def _release(self) -> None:
+        self._active -= 1
+        self._dispatch()
+
+    async def _acquire(self, tenant: str) -> float:
+        started = time.monotonic()
+        if self._active < self.max_concurrency and not self._heap:
+            self._active += 1
+            return 0.0
+
+        tag = max(self._virtual_time, self._last_tag.get(tenant, 0.0)) + 1.0 / self.weights.get(tenant, 1.0)
+        self._last_tag[tenant] = tag
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (tag, next(self._seq), future, tenant))
+        self._depth[tenant] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.queue_timeout)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # Admitted just as the deadline passed or the caller went away
+                self._release()
+            else:
+                future.cancel()
+                self._depth[tenant] -= 1
+            if isinstance(e, asyncio.TimeoutError):
+                self.shed += 1
+                logger.warning(f"Shedding generation request of tenant {tenant} after {self.queue_timeout}s in queue")
+                raise SchedulerBusy("The assistant is busy, please try again in a moment")
+            raise
+        return time.monotonic() - started
+
+    @asynccontextmanager
+    async def slot(self, tenant: str):
+        """Hold one of the generation slots; yields the seconds spent queued"""
+        waited = await self._acquire(tenant)
+        self.admitted += 1
+        self._waits.append(waited)
+        try:
+            yield waited
+        finally:
+            self._release()
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+        queued = {tenant: depth for tenant, depth in self._depth.items() if depth > 0}
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self._active,
+            "queue_depth": sum(queued.values()),
+            "queue_depth_by_tenant": dict(sorted(queued.items(), key=lambda item: -item[1])[:20]),
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "avg_wait_seconds": sum(waits) / len(waits) if waits else 0.0,
+            "p95_wait_seconds": waits[int(len(waits) * 0.95) - 1] if waits else 0.0,
+            "max_wait_seconds": waits[-1] if waits else 0.0,
+        }
+
+llm_scheduler = LLMScheduler(
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    queue_timeout=settings.LLM_QUEUE_TIMEOUT,
+    weights=settings.LLM_TENANT_WEIGHTS
+)
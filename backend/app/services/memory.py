@@ -0,0 +1,196 @@
+# backend/app/services/memory.py
+import asyncio
+import logging
+from datetime import datetime
+from typing import NamedTuple, Optional
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+
+from app.core.clients import clients
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.conversation_summary import ConversationSummary
+from app.models.message import Message
+from app.services.context import estimate_tokens, format_message, truncate_to_tokens
+from app.services.llm_scheduler import SchedulerBusy, llm_scheduler
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """Update the summary of a conversation between a user and an AI assistant.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}
+
+Write the updated summary in at most {words} words. Keep the user's goals, facts they stated, questions asked and what was answered; drop greetings and repetition. Reply with the summary only."""
+
+SUMMARY_INPUT_TOKENS = 1024  # Messages folded into the summary per refresh
+MAX_MESSAGE_TOKENS = 256  # A single long message (e.g. a pasted log) is cut to this for the summarizer
+PENDING_MESSAGE_TOKENS = 64  # Shortened form of a message that left the window but is not summarized yet
+
+class ConversationMemory(NamedTuple):
+    summary: str
+    pending: list[str]  # Shortened messages between the summary and the recent window
+    recent: list[Message]
+
+    def earlier(self) -> str:
+        """Prompt section for everything older than the recent window"""
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of the earlier conversation:\n{self.summary}")
+        if self.pending:
+            parts.append("Earlier messages (shortened):\n" + "\n".join(self.pending))
+        return "".join(f"{part}\n\n" for part in parts)
+
+def window_start(messages: list[Message], max_tokens: int) -> int:
+    """Index where the newest messages fitting max_tokens begin; the newest one is always included"""
+    start, used = len(messages), 0
+    while start > 0:
+        cost = estimate_tokens(format_message(messages[start - 1]))
+        if used + cost > max_tokens and start < len(messages):
+            break
+        used += cost
+        start -= 1
+    return start
+
+async def unsummarized_messages(
+    session: AsyncSession,
+    agent_id: UUID,
+    since: Optional[datetime],
+    limit: int,
+    before: Optional[datetime] = None,
+    newest: bool = True
+) -> list[Message]:
+    """Up to limit messages after since (newest or oldest ones), in chronological order"""
+    statement = select(Message).where(Message.agent_id == agent_id)
+    if since is not None:
+        statement = statement.where(Message.created_at > since)
+    if before is not None:
+        statement = statement.where(Message.created_at < before)
+    order = Message.created_at.desc() if newest else Message.created_at.asc()
+    result = await session.execute(statement.order_by(order).limit(limit))
+    return sorted(result.scalars().all(), key=lambda m: m.created_at)
+
+class ConversationMemories:
+    """Bounded chat history: a running summary of older turns plus recent turns verbatim.
+
+    Each turn sees the stored summary and the newest messages after it that
+    fit window_tokens. Once batch or more messages have fallen out of that
+    window, schedule_refresh() folds them into the summary in a background
+    task, off the request path; until then the newest batch of them are
+    sent cut to PENDING_MESSAGE_TOKENS each. Prompt size therefore stays
+    flat however long the conversation gets. Summaries are generated
+    through the LLM scheduler like answers and stored per agent in
+    ConversationSummary.
+    """
+
+    def __init__(self, window_tokens: int, window_messages: int, summary_tokens: int, batch: int):
+        self.window_tokens = window_tokens
+        self.window_messages = window_messages
+        self.summary_tokens = summary_tokens
+        self.batch = batch
+        self._refreshing: dict[str, asyncio.Task] = {}
+        self.refreshes = 0
+        self.failures = 0
+
+    async def load(self, agent_id: UUID, before: Optional[datetime] = None) -> ConversationMemory:
+        async with AsyncSessionLocal() as session:
+            state = await session.get(ConversationSummary, agent_id)
+            messages = await unsummarized_messages(
+                session,
+                agent_id,
+                state.summarized_until if state else None,
+                self.window_messages,
+                before=before
+            )
+        start = window_start(messages, self.window_tokens)
+        return ConversationMemory(
+            summary=state.summary if state else "",
+            pending=[
+                truncate_to_tokens(format_message(message), PENDING_MESSAGE_TOKENS)
+                for message in messages[max(start - self.batch, 0):start]
+            ],
+            recent=messages[start:]
+        )
+
+    def schedule_refresh(self, agent_id: UUID, tenant: str) -> None:
+        """Fold messages that left the recent window into the summary, in the background"""
+        key = str(agent_id)
+        if key in self._refreshing:
+            return
+        task = asyncio.create_task(self._refresh(agent_id, tenant))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    async def _refresh(self, agent_id: UUID, tenant: str) -> None:
+        try:
+            async with AsyncSessionLocal() as session:
+                state = await session.get(ConversationSummary, agent_id)
+                since = state.summarized_until if state else None
+                summary = state.summary if state else ""
+                recent = await unsummarized_messages(session, agent_id, since, self.window_messages)
+                oldest = await unsummarized_messages(session, agent_id, since, self.window_messages, newest=False)
+            window = recent[window_start(recent, self.window_tokens):]
+            overflow = [m for m in oldest if m.created_at < window[0].created_at] if window else []
+            if len(overflow) < self.batch:
+                return
+
+            folded, texts, used = [], [], 0
+            for message in overflow:
+                text = truncate_to_tokens(format_message(message), MAX_MESSAGE_TOKENS)
+                cost = estimate_tokens(text)
+                if folded and used + cost > SUMMARY_INPUT_TOKENS:
+                    break
+                folded.append(message)
+                texts.append(text)
+                used += cost
+
+            prompt = SUMMARY_PROMPT.format(
+                summary=summary or "(none yet)",
+                messages="\n".join(texts),
+                words=self.summary_tokens * 3 // 4
+            )
+            async with llm_scheduler.slot(tenant):
+                summary = await clients.ollama.agenerate(
+                    settings.LLM_MODEL,
+                    prompt,
+                    # Same num_ctx as answers, or the server reloads the model
+                    {"temperature": 0.1, "num_ctx": settings.LLM_NUM_CTX}
+                )
+            summary = truncate_to_tokens(summary.strip(), self.summary_tokens)
+
+            async with AsyncSessionLocal() as session:
+                state = await session.get(ConversationSummary, agent_id)
+                if state is None:
+                    state = ConversationSummary(agent_id=agent_id)
+                    session.add(state)
+                if state.summarized_until != since:
+                    # Another process folded these messages meanwhile
+                    return
+                state.summary = summary
+                state.summarized_until = folded[-1].created_at
+                state.summarized_messages += len(folded)
+                state.updated_at = datetime.utcnow()
+                await session.commit()
+            self.refreshes += 1
+            logger.debug(f"Folded {len(folded)} messages into the conversation summary of agent {agent_id}")
+        except SchedulerBusy:
+            # Retried after the next turn
+            logger.info(f"Skipped summary refresh of agent {agent_id}: generation queue is full")
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"Failed to refresh conversation summary of agent {agent_id}: {str(e)}")
+
+    def stats(self) -> dict:
+        return {"refreshing": len(self._refreshing), "refreshes": self.refreshes, "failures": self.failures}
+
+conversation_memories = ConversationMemories(
+    window_tokens=settings.HISTORY_WINDOW_TOKENS,
+    window_messages=settings.HISTORY_WINDOW_MESSAGES,
+    summary_tokens=settings.HISTORY_SUMMARY_TOKENS,
+    batch=settings.HISTORY_SUMMARY_BATCH
+)
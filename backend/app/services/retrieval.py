@@ -0,0 +1,108 @@
+# backend/app/services/retrieval.py
+import asyncio
+import logging
+from typing import Optional
+
+from langchain.schema import Document as LC_Document
+
+from app.core.clients import clients
+from app.core.config import settings
+from app.services.lexical import lexical_indexes
+from app.utils.bm25 import keyword_terms
+from app.utils.query_cache import QueryEmbeddingCache
+from app.utils.rerank import merge_adjacent, mmr
+from app.utils.vectorstore import Chunk, get_documents, get_vectorstore, query_vectors
+
+logger = logging.getLogger(__name__)
+
+query_embedding_cache = QueryEmbeddingCache(
+    max_entries=settings.QUERY_EMBEDDING_CACHE_SIZE,
+    ttl=settings.QUERY_EMBEDDING_CACHE_TTL
+)
+
+async def embed_query(query: str) -> list[float]:
+    return await query_embedding_cache.get_or_embed(
+        settings.EMBEDDING_MODEL,
+        query,
+        clients.embeddings.aembed_query
+    )
+
+async def dense_search(agent_id: str, query: str, k: int) -> list[Chunk]:
+    """Nearest chunks by embedding, reusing cached query embeddings"""
+    embedding = await embed_query(query)
+    return await asyncio.to_thread(
+        query_vectors,
+        get_vectorstore(agent_id),
+        embedding,
+        k,
+        {"agent_id": agent_id},
+        with_embeddings=True
+    )
+
+async def lexical_search(agent_id: str, query: str, k: int, version: Optional[int] = None) -> list[str]:
+    """Chunk ids ranked by BM25"""
+    index = await lexical_indexes.get(agent_id, version)
+    return [cid for cid, _ in index.search(query, k)]
+
+async def keyword_lookup(agent_id: str, query: str, k: int, version: Optional[int] = None) -> list[str]:
+    """Chunk ids containing all of the query's identifiers or quoted phrase; empty if it has none"""
+    terms = keyword_terms(query)
+    if not terms:
+        return []
+    index = await lexical_indexes.get(agent_id, version)
+    return [cid for cid, _ in index.search_all(terms, k)]
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> list[tuple[str, float]]:
+    """Merge ranked id lists; an id scores sum(1 / (k + rank)) over the lists it appears in"""
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, cid in enumerate(ranking, start=1):
+            scores[cid] = scores.get(cid, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+def _normalize(scores: list[float]) -> list[float]:
+    low, high = min(scores), max(scores)
+    return [(s - low) / (high - low) if high > low else 1.0 for s in scores]
+
+async def retrieve(agent_id: str, query: str, k: int = 5, version: Optional[int] = None) -> list[LC_Document]:
+    """Hybrid retrieval of an agent's chunks.
+
+    Dense and BM25 candidates are merged with reciprocal rank fusion, then
+    MMR picks k of them that are relevant but not redundant, and picked
+    chunks that are neighbours in the same document are joined. Queries
+    that look like lookups of an identifier or quoted phrase are answered
+    from the lexical index alone when chunks contain all of those terms,
+    which skips the embedding call. version is the agent's content
+    version, if known, so an outdated lexical index is rebuilt.
+    """
+    candidates = max(k, settings.RETRIEVAL_CANDIDATES)
+    lexical: list[str] = []
+    if settings.HYBRID_RETRIEVAL:
+        # Only the lookup terms themselves decide, so stopwords around them cannot
+        # turn an ordinary question into a lexical-only search
+        hits = await keyword_lookup(agent_id, query, k, version)
+        if hits:
+            found = await asyncio.to_thread(get_documents, get_vectorstore(agent_id), hits)
+            return merge_adjacent([chunk.document for chunk in found])
+        lexical = await lexical_search(agent_id, query, candidates, version)
+
+    dense = await dense_search(agent_id, query, candidates)
+    fused = reciprocal_rank_fusion([[chunk.id for chunk in dense], lexical], settings.RRF_K)[:candidates]
+
+    by_id = {chunk.id: chunk for chunk in dense}
+    missing = [cid for cid, _ in fused if cid not in by_id]
+    if missing:
+        found = await asyncio.to_thread(get_documents, get_vectorstore(agent_id), missing, with_embeddings=True)
+        by_id.update((chunk.id, chunk) for chunk in found)
+    ranked = [(by_id[cid], score) for cid, score in fused if cid in by_id]
+    if not ranked:
+        return []
+
+    selected = await asyncio.to_thread(
+        mmr,
+        _normalize([score for _, score in ranked]),
+        [chunk.embedding for chunk, _ in ranked],
+        k,
+        settings.RETRIEVAL_MMR_LAMBDA
+    )
+    return merge_adjacent([ranked[i][0].document for i in selected])
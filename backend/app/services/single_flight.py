@@ -0,0 +1,104 @@
+# backend/app/services/single_flight.py
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+TokenCallback = Callable[[str], Awaitable[None]]
+
+class Flight:
+    """One running computation whose streamed pieces and result are shared.
+
+    Pieces are kept for the lifetime of the flight, so a request that joins
+    late first receives everything streamed so far and then follows live.
+    """
+
+    def __init__(self):
+        self.parts: list[str] = []
+        self.done = False
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def _notify(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def publish(self, text: str) -> None:
+        self.parts.append(text)
+        self._notify()
+
+    def finish(self) -> None:
+        self.done = True
+        self._notify()
+
+    async def follow(self, on_token: TokenCallback) -> None:
+        """Send every piece to on_token in order until the flight is done or on_token fails"""
+        sent = 0
+        while True:
+            changed = self._changed
+            while sent < len(self.parts):
+                try:
+                    await on_token(self.parts[sent])
+                except Exception as e:
+                    logger.info(f"Stopped streaming shared answer: {str(e)}")
+                    return
+                sent += 1
+            if self.done:
+                return
+            await changed.wait()
+
+class SingleFlight:
+    """Coalesces concurrent identical requests into one computation.
+
+    The first request for a key starts compute(publish) as a task of its
+    own; requests for the same key arriving before it completes await that
+    task instead of starting another one. If a caller goes away, the
+    computation carries on for the others.
+    """
+
+    def __init__(self):
+        self._flights: dict[Hashable, Flight] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def _lead(self, key: Hashable, flight: Flight, compute: Callable[[TokenCallback], Awaitable[Any]]) -> Any:
+        try:
+            return await compute(flight.publish)
+        finally:
+            flight.finish()
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    async def run(
+        self,
+        key: Hashable,
+        compute: Callable[[TokenCallback], Awaitable[Any]],
+        on_token: Optional[TokenCallback] = None
+    ) -> tuple[Any, bool]:
+        """Result of compute for key and whether it was shared with an earlier request"""
+        flight = self._flights.get(key)
+        joined = flight is not None
+        if joined:
+            self.coalesced += 1
+        else:
+            self.started += 1
+            flight = Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._lead(key, flight, compute))
+
+        follower = asyncio.create_task(flight.follow(on_token)) if on_token else None
+        try:
+            result = await asyncio.shield(flight.task)
+        except BaseException:
+            if follower:
+                follower.cancel()
+            raise
+        if follower:
+            await follower
+        return result, joined
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._flights), "started": self.started, "coalesced": self.coalesced}
+
+single_flight = SingleFlight()
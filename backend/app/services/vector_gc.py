@@ -0,0 +1,130 @@
+# backend/app/services/vector_gc.py
+import asyncio
+import logging
+import time
+from uuid import UUID
+
+from sqlmodel import select
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.document import Document, DocumentStatus
+from app.utils.vectorstore import (
+    AGENT_COLLECTION_PREFIX,
+    agent_where,
+    collection_name,
+    count_vectors,
+    delete_vectors,
+    drop_collection,
+    get_vectorstore,
+    is_agent_collection,
+    iter_metadatas,
+    list_collection_names,
+)
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = (DocumentStatus.QUEUED, DocumentStatus.PARSING, DocumentStatus.EMBEDDING)
+
+async def purge_document_vectors(doc_id: UUID, agent_id: UUID) -> None:
+    vectorstore = get_vectorstore(str(agent_id))
+    await asyncio.to_thread(delete_vectors, vectorstore, where={"doc_id": str(doc_id)})
+
+async def purge_agent_vectors(agent_id: UUID) -> None:
+    if settings.VECTOR_COLLECTION_MODE == "per_agent":
+        name = collection_name(str(agent_id))
+        if name in await asyncio.to_thread(list_collection_names):
+            await asyncio.to_thread(drop_collection, name)
+        return
+    vectorstore = get_vectorstore(str(agent_id))
+    await asyncio.to_thread(delete_vectors, vectorstore, where=agent_where(str(agent_id)))
+
+def _scan_vectors(vectorstore) -> tuple[int, dict[str, set[str]], dict[str, set[str]], list[str]]:
+    """Collect live and staged vector ids per doc_id, plus ids of retired or malformed chunks"""
+    total, live, staged, retired = 0, {}, {}, []
+    for vector_id, metadata in iter_metadatas(vectorstore):
+        total += 1
+        metadata = metadata or {}
+        doc_id = metadata.get("doc_id")
+        if not doc_id or str(metadata.get("agent_id", "")).startswith("retired:"):
+            retired.append(vector_id)
+            continue
+        by_doc = staged if str(metadata.get("agent_id", "")).startswith("staged:") else live
+        by_doc.setdefault(doc_id, set()).add(vector_id)
+    return total, live, staged, retired
+
+async def _document_statuses(doc_ids: set[str]) -> dict[str, DocumentStatus]:
+    """Current status of those of doc_ids that still exist"""
+    ids = []
+    for doc_id in doc_ids:
+        try:
+            ids.append(UUID(doc_id))
+        except ValueError:
+            continue  # Not a document id at all, so orphaned
+    statuses = {}
+    async with AsyncSessionLocal() as session:
+        for start in range(0, len(ids), 500):
+            result = await session.execute(
+                select(Document.id, Document.status).where(Document.id.in_(ids[start:start + 500]))
+            )
+            statuses.update((str(doc_id), status) for doc_id, status in result.all())
+    return statuses
+
+async def reconcile_vectors(dry_run: bool = False) -> dict:
+    """Delete vectors whose document no longer exists, and leftover staged/retired chunks.
+
+    Every agent collection is scanned. Documents are looked up after their
+    collection was scanned, so chunks written by an upload that started
+    during the scan are never mistaken for orphans. Staged chunks are only
+    removed when their document is not being ingested. Returns a report
+    with the index size before and after.
+    """
+    started = time.time()
+    before = after = orphan_doc_count = orphan_vector_count = 0
+    names = [name for name in await asyncio.to_thread(list_collection_names) if is_agent_collection(name)]
+    for name in names:
+        vectorstore = get_vectorstore(name=name)
+        total, live, staged, orphans = await asyncio.to_thread(_scan_vectors, vectorstore)
+        documents = await _document_statuses(set(live) | set(staged))
+
+        orphan_docs = [doc_id for doc_id in set(live) | set(staged) if doc_id not in documents]
+        for doc_id in orphan_docs:
+            orphans.extend(live.get(doc_id, ()))
+            orphans.extend(staged.get(doc_id, ()))
+        for doc_id, vector_ids in staged.items():
+            if doc_id in documents and documents[doc_id] not in ACTIVE_STATUSES:
+                orphans.extend(vector_ids)
+
+        if not dry_run:
+            for start in range(0, len(orphans), 1000):
+                await asyncio.to_thread(delete_vectors, vectorstore, ids=orphans[start:start + 1000])
+        remaining = total - len(orphans) if dry_run else await asyncio.to_thread(count_vectors, vectorstore)
+        # An emptied per-agent collection belongs to a deleted agent
+        if not dry_run and remaining == 0 and name.startswith(AGENT_COLLECTION_PREFIX):
+            await asyncio.to_thread(drop_collection, name)
+
+        before += total
+        after += remaining
+        orphan_doc_count += len(orphan_docs)
+        orphan_vector_count += len(orphans)
+
+    report = {
+        "dry_run": dry_run,
+        "collections": len(names),
+        "vectors_before": before,
+        "vectors_after": after,
+        "orphan_documents": orphan_doc_count,
+        "orphan_vectors": orphan_vector_count,
+        "duration_seconds": round(time.time() - started, 3),
+    }
+    logger.info(f"Vector reconciliation: {report}")
+    return report
+
+async def reconcile_loop(interval: float) -> None:
+    """Run reconcile_vectors every interval seconds until cancelled"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await reconcile_vectors()
+        except Exception as e:
+            logger.error(f"Vector reconciliation failed: {str(e)}", exc_info=True)
@@ -0,0 +1,123 @@
+# app/utils/bm25.py
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./:#][a-z0-9]+)*")
+SEPARATOR_RE = re.compile(r"[-_./:#]")
+QUOTES = "\"'`"
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased word tokens; compound identifiers (ERR-1042, v2.3.1) are kept whole and split"""
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(part for part in SEPARATOR_RE.split(token) if part)
+    return tokens
+
+def is_identifier(word: str) -> bool:
+    word = word.strip(QUOTES + ".,;:?!()[]{}")
+    if len(word) < 2:
+        return False
+    has_digit = any(c.isdigit() for c in word)
+    has_alpha = any(c.isalpha() for c in word)
+    return (
+        (has_digit and (has_alpha or len(word) >= 4))
+        or bool(re.search(r"\w[-_./:#]\w", word))
+        or (word.isupper() and len(word) >= 3)
+    )
+
+def keyword_terms(query: str, max_words: int = 3) -> list[str]:
+    """Terms of a lookup query (a quoted phrase, or only identifiers); empty for other queries"""
+    query = query.strip()
+    if len(query) > 2 and query[0] == query[-1] and query[0] in QUOTES:
+        return tokenize(query[1:-1])
+    words = query.split()
+    if not 0 < len(words) <= max_words or not all(is_identifier(w) for w in words):
+        return []
+    return tokenize(query)
+
+class BM25Index:
+    """Inverted index over chunks scored with Okapi BM25.
+
+    Chunks are grouped by doc_id so a document can be removed or replaced
+    as a whole. Only term statistics are kept; chunk texts stay in the
+    vector store.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: dict[str, dict[str, int]] = defaultdict(dict)
+        self._lengths: dict[str, int] = {}
+        self._chunk_terms: dict[str, tuple[str, ...]] = {}
+        self._doc_chunks: dict[str, set[str]] = defaultdict(set)
+        self._chunk_doc: dict[str, str] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, chunk_id: str, text: str, doc_id: str) -> None:
+        if chunk_id in self._lengths:
+            self.remove(chunk_id)
+        counts = Counter(tokenize(text))
+        for term, tf in counts.items():
+            self._postings[term][chunk_id] = tf
+        length = sum(counts.values())
+        self._lengths[chunk_id] = length
+        self._chunk_terms[chunk_id] = tuple(counts)
+        self._doc_chunks[doc_id].add(chunk_id)
+        self._chunk_doc[chunk_id] = doc_id
+        self._total_length += length
+
+    def remove(self, chunk_id: str) -> None:
+        if chunk_id not in self._lengths:
+            return
+        for term in self._chunk_terms.pop(chunk_id):
+            postings = self._postings[term]
+            postings.pop(chunk_id, None)
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._lengths.pop(chunk_id)
+        doc_id = self._chunk_doc.pop(chunk_id)
+        self._doc_chunks[doc_id].discard(chunk_id)
+        if not self._doc_chunks[doc_id]:
+            del self._doc_chunks[doc_id]
+
+    def remove_document(self, doc_id: str) -> None:
+        for chunk_id in list(self._doc_chunks.get(doc_id, ())):
+            self.remove(chunk_id)
+
+    def search(self, query: str, k: int) -> list[tuple[str, float]]:
+        """Top k (chunk_id, score) pairs for the query terms, best first"""
+        if not self._lengths:
+            return []
+        n = len(self._lengths)
+        avg_length = self._total_length / n or 1.0
+        scores: dict[str, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[chunk_id] / avg_length)
+                scores[chunk_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def search_all(self, terms: list[str], k: int) -> list[tuple[str, float]]:
+        """Like search, restricted to chunks containing every one of terms"""
+        postings = [self._postings.get(term) for term in set(terms)]
+        if not postings or not all(postings):
+            return []
+        matching = set.intersection(*(set(p) for p in postings))
+        if not matching:
+            return []
+        ranked = self.search(" ".join(terms), len(self._lengths))
+        return [(cid, score) for cid, score in ranked if cid in matching][:k]
+
+    def stats(self) -> dict:
+        return {"chunks": len(self._lengths), "terms": len(self._postings), "documents": len(self._doc_chunks)}
@@ -1,5 +1,60 @@
+import asyncio
+from typing import AsyncIterable, AsyncIterator, Optional
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
+from app.utils.parser import Segment
+
 def chunk_text(text: str, chunk_size=1000, chunk_overlap=200) -> list[str]:
     splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
     return splitter.split_text(text)
+
+class IncrementalSplitter:
+    """Splits a stream of segments with the same settings as chunk_text.
+
+    Only the trailing, possibly incomplete chunk is carried over to the next
+    segment, so chunks can span page boundaries while the buffer never holds
+    more than one segment plus one chunk. A chunk takes the metadata of the
+    segment it starts in. Segments marked is_chunk (table row groups) are
+    passed through unchanged.
+    """
+
+    def __init__(self, chunk_size=1000, chunk_overlap=200):
+        self.splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        self._carry = ""
+        self._carry_metadata: Optional[dict] = None
+
+    def feed(self, segment: Segment) -> list[tuple[str, dict]]:
+        if not segment.text.strip():
+            return []
+        if segment.is_chunk:
+            return self.flush() + [(segment.text, segment.metadata)]
+        first_metadata = self._carry_metadata if self._carry else segment.metadata
+        pieces = self.splitter.split_text(
+            f"{self._carry}\n{segment.text}" if self._carry else segment.text
+        )
+        if not pieces:
+            return []
+        chunks = [
+            (piece, first_metadata if i == 0 else segment.metadata)
+            for i, piece in enumerate(pieces)
+        ]
+        (self._carry, self._carry_metadata) = chunks.pop()
+        return chunks
+
+    def flush(self) -> list[tuple[str, dict]]:
+        chunks = [(self._carry, self._carry_metadata)] if self._carry else []
+        self._carry, self._carry_metadata = "", None
+        return chunks
+
+async def aiter_chunks(
+    segments: AsyncIterable[Segment],
+    chunk_size=1000,
+    chunk_overlap=200
+) -> AsyncIterator[tuple[str, dict]]:
+    """Turn a segment stream into a (text, metadata) chunk stream"""
+    splitter = IncrementalSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    async for segment in segments:
+        for chunk in await asyncio.to_thread(splitter.feed, segment):
+            yield chunk
+    for chunk in splitter.flush():
+        yield chunk
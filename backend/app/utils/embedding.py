@@ -1,8 +1,156 @@
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import OllamaEmbeddings
-from langchain.schema import Document as LC_Document
-
-def embed_chunks(chunks: list[str], doc_id: str, agent_id: str):
-    docs = [LC_Document(page_content=c, metadata={"agent_id": agent_id, "doc_id": doc_id}) for c in chunks]
-    vectorstore = Chroma(collection_name="agent_store", embedding_function=OllamaEmbeddings(model="llama3", base_url="http://backend-ollama-1:11434"))
-    vectorstore.add_documents(docs)
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterable, Awaitable, Callable, Optional
+
+from app.core.config import settings
+from app.utils.vectorstore import add_chunks, chunk_id, get_vectorstore, staged_agent_id
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingError(Exception):
+    """Raised when one or more embedding batches could not be stored"""
+    pass
+
+_pool: Optional[ThreadPoolExecutor] = None
+_slots: Optional[asyncio.Semaphore] = None
+
+def get_embedding_pool() -> ThreadPoolExecutor:
+    """Threads for embedding batches, kept apart from the default executor chat requests use"""
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(
+            max_workers=settings.EMBEDDING_MAX_CONCURRENCY,
+            thread_name_prefix="embedding"
+        )
+    return _pool
+
+def embedding_slots() -> asyncio.Semaphore:
+    """Process-wide limit on batches in flight to the embedding server"""
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(settings.EMBEDDING_MAX_CONCURRENCY)
+    return _slots
+
+def shutdown_embedding_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+async def _aiter_list(chunks: list[str], doc_id: str, metadatas: Optional[list[dict]]):
+    seen = set()
+    for i, chunk in enumerate(chunks):
+        cid = chunk_id(doc_id, chunk)
+        if cid not in seen:
+            seen.add(cid)
+            yield cid, chunk, {**(metadatas[i] if metadatas else {}), "chunk_index": i}
+
+async def embed_chunks(
+    chunks: list[str],
+    doc_id: str,
+    agent_id: str,
+    metadatas: Optional[list[dict]] = None,
+    on_progress: Optional[Callable[[int, int], Awaitable[None]]] = None
+) -> int:
+    """Embed an in-memory list of chunks; see embed_stream"""
+    return await embed_stream(
+        _aiter_list(chunks, doc_id, metadatas),
+        doc_id=doc_id,
+        agent_id=agent_id,
+        on_progress=on_progress
+    )
+
+async def embed_stream(
+    chunks: AsyncIterable[tuple[str, str, dict]],
+    doc_id: str,
+    agent_id: str,
+    staged: bool = False,
+    on_progress: Optional[Callable[[int, int], Awaitable[None]]] = None
+) -> int:
+    """Embed (id, text, metadata) chunks in batches as they are produced.
+
+    Ids must be unique within the stream; chunk_id() gives content-addressed
+    ids, which also makes a retried batch overwrite rather than duplicate.
+    Chunks are written to the agent's collection, under staged_agent_id()
+    when staged is set so retrieval does not see them yet.
+
+    Batches go through a queue that holds at most EMBEDDING_MAX_CONCURRENCY
+    batches, drained by as many workers; when the embedding server falls
+    behind the producer blocks, so peak memory depends on the batch size and
+    not on the document size. Across all documents being ingested at most
+    EMBEDDING_MAX_CONCURRENCY batches are in flight, on a thread pool of
+    their own. Every batch is retried on its own, so a
+    failing batch does not discard the ones already written. Chunks whose
+    text was embedded before are served from the embedding cache.
+
+    on_progress receives (chunks stored, chunks produced so far). Returns
+    the number of stored chunks and raises EmbeddingError if any batch
+    ultimately failed.
+    """
+    vectorstore = get_vectorstore(agent_id)
+    owner = staged_agent_id(agent_id) if staged else agent_id
+    queue: asyncio.Queue = asyncio.Queue(maxsize=settings.EMBEDDING_MAX_CONCURRENCY)
+    produced = done = 0
+    failures: list[Exception] = []
+
+    async def store_batch(start: int, ids: list[str], texts: list[str], metadatas: list[dict]) -> None:
+        metadatas = [{**m, "agent_id": owner, "doc_id": doc_id} for m in metadatas]
+        for attempt in range(1, settings.EMBEDDING_MAX_RETRIES + 1):
+            try:
+                async with embedding_slots():
+                    await asyncio.get_running_loop().run_in_executor(
+                        get_embedding_pool(), add_chunks, vectorstore, ids, texts, metadatas
+                    )
+                return
+            except Exception as e:
+                if attempt == settings.EMBEDDING_MAX_RETRIES:
+                    logger.error(f"Embedding batch at {start} for document {doc_id} failed: {str(e)}")
+                    raise
+                delay = settings.EMBEDDING_RETRY_BACKOFF * 2 ** (attempt - 1)
+                logger.warning(f"Embedding batch at {start} failed (attempt {attempt}), retrying in {delay}s: {str(e)}")
+                await asyncio.sleep(delay)
+
+    async def worker() -> None:
+        nonlocal done
+        while (batch := await queue.get()) is not None:
+            start, ids, texts, metadatas = batch
+            try:
+                await store_batch(start, ids, texts, metadatas)
+            except Exception as e:
+                failures.append(e)
+                continue
+            done += len(texts)
+            if on_progress:
+                try:
+                    await on_progress(done, produced)
+                except Exception as e:
+                    logger.warning(f"Progress update for document {doc_id} failed: {str(e)}")
+
+    workers = [asyncio.create_task(worker()) for _ in range(settings.EMBEDDING_MAX_CONCURRENCY)]
+    try:
+        ids, texts, metadatas = [], [], []
+        async for cid, text, metadata in chunks:
+            ids.append(cid)
+            texts.append(text)
+            metadatas.append(metadata)
+            if len(texts) == settings.EMBEDDING_BATCH_SIZE:
+                await queue.put((produced, ids, texts, metadatas))
+                produced += len(texts)
+                ids, texts, metadatas = [], [], []
+        if texts:
+            await queue.put((produced, ids, texts, metadatas))
+            produced += len(texts)
+
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+
+    if failures:
+        raise EmbeddingError(
+            f"{len(failures)} embedding batches failed ({produced - done} of {produced} chunks): {str(failures[0])}"
+        )
+    return done
@@ -0,0 +1,146 @@
+# app/utils/embedding_cache.py
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Optional
+
+from langchain_core.embeddings import Embeddings
+
+from app.core.config import settings
+from app.utils.hashing import sha256_text
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingCache:
+    """Persistent embedding cache keyed by (model, sha256 of chunk text).
+
+    Vectors are stored as packed float32 blobs in SQLite. Once the cache
+    holds more than max_entries rows, the least recently used ones are
+    evicted.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._size = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL,"
+                " hash TEXT NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " last_used REAL NOT NULL,"
+                " PRIMARY KEY (model, hash))"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)"
+            )
+            self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return self._conn
+
+    def get_many(self, model: str, hashes: list[str]) -> dict[str, list[float]]:
+        if not hashes:
+            return {}
+        with self._lock:
+            conn = self._connect()
+            found = {}
+            unique = list(dict.fromkeys(hashes))
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(unique), 500):
+                part = unique[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({','.join('?' * len(part))})",
+                    [model, *part]
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND hash = ?",
+                    [(now, model, h) for h in found]
+                )
+                conn.commit()
+            hit_count = sum(1 for h in hashes if h in found)
+            self.hits += hit_count
+            self.misses += len(hashes) - hit_count
+            return found
+
+    def put_many(self, model: str, vectors: dict[str, list[float]]) -> None:
+        if not vectors:
+            return
+        with self._lock:
+            conn = self._connect()
+            now = time.time()
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                [(model, h, array("f", v).tobytes(), now) for h, v in vectors.items()]
+            )
+            self._size += conn.total_changes - before
+            overflow = self._size - self.max_entries
+            if overflow > 0:
+                conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN ("
+                    " SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (overflow,)
+                )
+                self._size -= overflow
+                self.evictions += overflow
+            conn.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only sends cache misses to the underlying model"""
+
+    def __init__(self, underlying: Embeddings, cache: EmbeddingCache, model: str):
+        self.underlying = underlying
+        self.cache = cache
+        self.model = model
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        hashes = [sha256_text(t) for t in texts]
+        vectors = self.cache.get_many(self.model, hashes)
+
+        missing = {h: t for h, t in zip(hashes, texts) if h not in vectors}
+        if missing:
+            computed = self.underlying.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), computed))
+            self.cache.put_many(self.model, fresh)
+            vectors.update(fresh)
+
+        return [vectors[h] for h in hashes]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.underlying.embed_query(text)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return await self.underlying.aembed_query(text)
+
+embedding_cache = EmbeddingCache(
+    path=settings.EMBEDDING_CACHE_PATH,
+    max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES
+)
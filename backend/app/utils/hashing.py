@@ -1,4 +1,5 @@
 #app/utils/hashing.py
+import hashlib
 from passlib.context import CryptContext
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -8,3 +9,7 @@ def hash_password(password: str) -> str:
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
+
+def sha256_text(text: str) -> str:
+    """Content hash used to address chunks and files"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
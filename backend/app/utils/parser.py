@@ -1,25 +1,240 @@
-from typing import Union
-import fitz  
+import asyncio
+import csv
+import io
+import multiprocessing
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, Iterator, NamedTuple, Optional
+import fitz
 import docx
+import openpyxl
+
+from app.core.config import settings
+
+PDF_TYPES = ("application/pdf",)
+DOCX_TYPES = ("application/vnd.openxmlformats-officedocument.wordprocessingml.document", "application/msword")
+TEXT_TYPES = ("text/plain",)
+CSV_TYPES = ("text/csv", "application/csv")
+# Browsers on Windows report .csv files as application/vnd.ms-excel, so that
+# type is told apart from a real workbook by looking at the file itself
+EXCEL_TYPES = ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "application/vnd.ms-excel")
+TABLE_TYPES = CSV_TYPES + EXCEL_TYPES
+SUPPORTED_TYPES = PDF_TYPES + DOCX_TYPES + TEXT_TYPES + TABLE_TYPES
+OLE2_MAGIC = b"\xd0\xcf\x11\xe0"  # Legacy binary Office files such as .xls
+
+class Segment(NamedTuple):
+    """A page or section of a document with the metadata it contributes to its chunks"""
+    text: str
+    metadata: dict
+    is_chunk: bool = False  # Already sized as a chunk, must not be merged or re-split
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def get_parser_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: forking a process that runs an event loop and threads is unsafe
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.PARSER_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+def shutdown_parser_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+def pdf_page_count(file_path: str) -> int:
+    with fitz.open(file_path) as doc:
+        return doc.page_count
+
+def extract_pdf_pages(file_path: str, start: int, end: int) -> list[Segment]:
+    """Extract pages [start, end) of a PDF; page numbers in metadata are 1-based"""
+    with fitz.open(file_path) as doc:
+        return [
+            Segment(doc[i].get_text(), {"page": i + 1})
+            for i in range(start, min(end, doc.page_count))
+        ]
+
+def iter_pdf_pages(file_path: str) -> Iterator[Segment]:
+    with fitz.open(file_path) as doc:
+        for i, page in enumerate(doc):
+            yield Segment(page.get_text(), {"page": i + 1})
+
+def iter_docx_sections(file_path: str) -> Iterator[Segment]:
+    """Group paragraphs into sections that start at each heading"""
+    doc = docx.Document(file_path)
+    section, metadata, paragraphs = 1, {"section": 1}, []
+    for para in doc.paragraphs:
+        if para.style is not None and para.style.name.startswith("Heading"):
+            if paragraphs:
+                yield Segment("\n".join(paragraphs), metadata)
+                section, paragraphs = section + 1, []
+            metadata = {"section": section, "heading": para.text}
+        paragraphs.append(para.text)
+    if paragraphs:
+        yield Segment("\n".join(paragraphs), metadata)
+
+def extract_docx_sections(file_path: str) -> list[Segment]:
+    return list(iter_docx_sections(file_path))
+
+def iter_txt_blocks(file_path: str, block_size: int = 64 * 1024) -> Iterator[Segment]:
+    """Read plain text in blocks, breaking on line boundaries"""
+    with open(file_path, "r", encoding="utf-8") as f:
+        block, size, number = [], 0, 1
+        for line in f:
+            block.append(line)
+            size += len(line)
+            if size >= block_size:
+                yield Segment("".join(block), {"block": number})
+                block, size, number = [], 0, number + 1
+        if block:
+            yield Segment("".join(block), {"block": number})
+
+def _format_rows(rows: list[list[str]]) -> str:
+    out = io.StringIO()
+    csv.writer(out, lineterminator="\n").writerows(rows)
+    return out.getvalue()
+
+def group_rows(
+    rows: Iterator[list],
+    metadata: dict,
+    max_chars: int = 1000
+) -> Iterator[Segment]:
+    """Group table rows into chunks that each start with the header row.
+
+    Rows are added until the chunk reaches max_chars or TABLE_ROWS_PER_CHUNK
+    rows, so retrieval always sees column names next to the values. The
+    first non-empty row is the header; row numbers in metadata are 1-based
+    positions in the sheet.
+    """
+    header = None
+    block, size, first_row, last_row = [], 0, 0, 0
+    for number, row in enumerate(rows, start=1):
+        row = ["" if value is None else str(value) for value in row]
+        if not any(row):
+            continue
+        if header is None:
+            header = row
+            header_size = len(_format_rows([header]))
+            continue
+        row_size = len(_format_rows([row]))
+        if block and (header_size + size + row_size > max_chars or len(block) >= settings.TABLE_ROWS_PER_CHUNK):
+            yield Segment(
+                _format_rows([header, *block]),
+                {**metadata, "row_start": first_row, "row_end": last_row},
+                is_chunk=True
+            )
+            block, size = [], 0
+        if not block:
+            first_row = number
+        block.append(row)
+        size += row_size
+        last_row = number
+    if block:
+        yield Segment(
+            _format_rows([header, *block]),
+            {**metadata, "row_start": first_row, "row_end": last_row},
+            is_chunk=True
+        )
+
+def iter_csv_rows(file_path: str) -> Iterator[Segment]:
+    with open(file_path, "r", encoding="utf-8-sig", errors="replace", newline="") as f:
+        yield from group_rows(csv.reader(f), {})
+
+def iter_excel_rows(file_path: str) -> Iterator[Segment]:
+    # read_only streams rows from the sheet XML instead of loading the workbook
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            yield from group_rows(sheet.iter_rows(values_only=True), {"sheet": sheet.title})
+    finally:
+        workbook.close()
+
+def is_ole2_file(file_path: str) -> bool:
+    with open(file_path, "rb") as f:
+        return f.read(len(OLE2_MAGIC)) == OLE2_MAGIC
+
+def iter_table_rows(file_path: str, content_type: str) -> Iterator[Segment]:
+    if content_type in EXCEL_TYPES:
+        if zipfile.is_zipfile(file_path):
+            return iter_excel_rows(file_path)
+        # A legacy .xls workbook would otherwise be read as CSV and embedded as garbage
+        if is_ole2_file(file_path):
+            raise ValueError("Unsupported file type: legacy .xls workbooks must be saved as .xlsx or .csv")
+    return iter_csv_rows(file_path)
+
+def iter_segments(file_path: str, content_type: str) -> Iterator[Segment]:
+    if content_type in PDF_TYPES:
+        return iter_pdf_pages(file_path)
+    elif content_type in DOCX_TYPES:
+        return iter_docx_sections(file_path)
+    elif content_type in TEXT_TYPES:
+        return iter_txt_blocks(file_path)
+    elif content_type in TABLE_TYPES:
+        return iter_table_rows(file_path, content_type)
+    else:
+        raise ValueError("Unsupported file type")
+
+async def aiter_segments(file_path: str, content_type: str) -> AsyncIterator[Segment]:
+    """Yield document segments in order, parsing in the process pool.
+
+    PDFs are split into page ranges that are parsed in parallel, with at most
+    two ranges per worker process in flight, so memory stays flat no matter
+    how many pages the file has.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_parser_pool()
+
+    if content_type in PDF_TYPES:
+        pages = await loop.run_in_executor(pool, pdf_page_count, file_path)
+        step = settings.PARSER_PAGES_PER_TASK
+        ranges = iter(range(0, pages, step))
+        pending = deque()
+        for start in ranges:
+            pending.append(loop.run_in_executor(pool, extract_pdf_pages, file_path, start, start + step))
+            if len(pending) >= settings.PARSER_PROCESSES * 2:
+                break
+        while pending:
+            segments = await pending.popleft()
+            start = next(ranges, None)
+            if start is not None:
+                pending.append(loop.run_in_executor(pool, extract_pdf_pages, file_path, start, start + step))
+            for segment in segments:
+                yield segment
+    elif content_type in DOCX_TYPES:
+        for segment in await loop.run_in_executor(pool, extract_docx_sections, file_path):
+            yield segment
+    elif content_type in TEXT_TYPES + TABLE_TYPES:
+        # Streamed row by row or line by line, so a thread keeps memory flat
+        # where a process would have to return the whole file at once
+        segments = iter_segments(file_path, content_type)
+        while (segment := await asyncio.to_thread(next, segments, None)) is not None:
+            yield segment
+    else:
+        raise ValueError("Unsupported file type")
 
 def extract_text_from_pdf(file_path: str) -> str:
-    doc = fitz.open(file_path)
-    return "\n".join([page.get_text() for page in doc])
+    return "\n".join(segment.text for segment in iter_pdf_pages(file_path))
 
 def extract_text_from_docx(file_path: str) -> str:
-    doc = docx.Document(file_path)
-    return "\n".join([para.text for para in doc.paragraphs])
+    return "\n".join(segment.text for segment in iter_docx_sections(file_path))
 
 def extract_text_from_txt(file_path: str) -> str:
     with open(file_path, "r", encoding="utf-8") as f:
         return f.read()
 
 def extract_text(file_path: str, content_type: str) -> str:
-    if content_type == "application/pdf":
+    if content_type in PDF_TYPES:
         return extract_text_from_pdf(file_path)
-    elif content_type in ("application/vnd.openxmlformats-officedocument.wordprocessingml.document", "application/msword"):
+    elif content_type in DOCX_TYPES:
         return extract_text_from_docx(file_path)
-    elif content_type == "text/plain":
+    elif content_type in TEXT_TYPES:
         return extract_text_from_txt(file_path)
+    elif content_type in TABLE_TYPES:
+        return "\n".join(segment.text for segment in iter_table_rows(file_path, content_type))
     else:
         raise ValueError("Unsupported file type")
@@ -0,0 +1,77 @@
+# app/utils/query_cache.py
+import time
+from array import array
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+def normalize_query(text: str) -> str:
+    """Case- and whitespace-insensitive form of a query, used as cache key"""
+    return " ".join(text.lower().split())
+
+class QueryEmbeddingCache:
+    """In-process LRU cache of query embeddings with optional TTL.
+
+    Keyed by (model, normalized query). Vectors are kept as float32 arrays,
+    so memory is bounded by max_entries * dimension * 4 bytes.
+    """
+
+    def __init__(self, max_entries: int, ttl: float = 0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[tuple[str, str], tuple[float, array]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.embed_seconds = 0.0
+
+    def get(self, model: str, text: str):
+        key = (model, normalize_query(text))
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, vector = entry
+        if self.ttl and expires < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return vector.tolist()
+
+    def put(self, model: str, text: str, vector: list[float]) -> None:
+        key = (model, normalize_query(text))
+        self._entries[key] = (time.monotonic() + self.ttl, array("f", vector))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_embed(
+        self,
+        model: str,
+        text: str,
+        embed: Callable[[str], Awaitable[list[float]]]
+    ) -> list[float]:
+        vector = self.get(model, text)
+        if vector is not None:
+            self.hits += 1
+            return vector
+        self.misses += 1
+        started = time.perf_counter()
+        vector = await embed(text)
+        self.embed_seconds += time.perf_counter() - started
+        self.put(model, text, vector)
+        return vector
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        avg_embed = self.embed_seconds / self.misses if self.misses else 0.0
+        dimension = len(next(iter(self._entries.values()))[1]) if self._entries else 0
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "approx_bytes": len(self._entries) * dimension * 4,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "avg_embed_seconds": avg_embed,
+            # Estimated from the average latency of the misses
+            "saved_seconds": self.hits * avg_embed,
+        }
@@ -0,0 +1,83 @@
+# app/utils/rerank.py
+import numpy as np
+from langchain.schema import Document as LC_Document
+
+def mmr(relevance: list[float], embeddings: list[list[float]], k: int, lambda_mult: float = 0.7) -> list[int]:
+    """Maximal marginal relevance selection of k candidates.
+
+    Each step picks the candidate maximizing
+    lambda_mult * relevance - (1 - lambda_mult) * max similarity to the ones
+    already picked, with cosine similarities computed in one matrix product.
+    Returns candidate indices in selection order.
+    """
+    n = len(relevance)
+    if n <= 1 or k <= 0:
+        return list(range(min(n, k)))
+
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1, norms)
+    similarity = vectors @ vectors.T
+    relevance = np.asarray(relevance, dtype=np.float32)
+
+    selected: list[int] = []
+    redundancy = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    for _ in range(min(k, n)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+    return selected
+
+def _overlap(left: str, right: str, max_overlap: int) -> int:
+    """Length of the longest suffix of left that is a prefix of right"""
+    for size in range(min(len(left), len(right), max_overlap), 0, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+def merge_adjacent(docs: list[LC_Document], max_overlap: int = 400) -> list[LC_Document]:
+    """Join chunks with consecutive chunk_index from the same document.
+
+    The text the splitter repeated between neighbouring chunks is dropped,
+    exact duplicate texts are removed, and a merged chunk takes the position
+    of its best ranked part.
+    """
+    ranked: list[tuple[int, LC_Document]] = []
+    by_doc: dict[str, list[tuple[int, int, LC_Document]]] = {}
+    seen_texts = set()
+    for position, doc in enumerate(docs):
+        if doc.page_content in seen_texts:
+            continue
+        seen_texts.add(doc.page_content)
+        doc_id = doc.metadata.get("doc_id")
+        index = doc.metadata.get("chunk_index")
+        if doc_id is None or index is None:
+            ranked.append((position, doc))
+        else:
+            by_doc.setdefault(doc_id, []).append((index, position, doc))
+
+    for parts in by_doc.values():
+        parts.sort(key=lambda part: part[0])
+        first_index, position, first = parts[0]
+        text, last_index = first.page_content, first_index
+        for index, part_position, doc in parts[1:]:
+            if index == last_index + 1:
+                overlap = _overlap(text, doc.page_content, max_overlap)
+                text += doc.page_content[overlap:] if overlap else f"\n{doc.page_content}"
+                position = min(position, part_position)
+            else:
+                ranked.append((position, _merged(first, text, last_index)))
+                first, text, position = doc, doc.page_content, part_position
+            last_index = index
+        ranked.append((position, _merged(first, text, last_index)))
+
+    return [doc for _, doc in sorted(ranked, key=lambda item: item[0])]
+
+def _merged(first: LC_Document, text: str, last_index: int) -> LC_Document:
+    if text is first.page_content:
+        return first
+    return LC_Document(page_content=text, metadata={**first.metadata, "chunk_end": last_index})
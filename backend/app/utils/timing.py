@@ -0,0 +1,35 @@
+# app/utils/timing.py
+import time
+from contextlib import contextmanager
+from typing import Awaitable, TypeVar
+
+T = TypeVar("T")
+
+class StageTimer:
+    """Wall-clock seconds per named stage of a request; concurrent stages overlap"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings: dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round(time.perf_counter() - start, 4)
+
+    async def run(self, name: str, awaitable: Awaitable[T]) -> T:
+        with self.stage(name):
+            return await awaitable
+
+    def mark(self, name: str) -> None:
+        """Record the time since the start of the request, e.g. time to first token"""
+        self.timings[name] = round(self.elapsed(), 4)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def report(self) -> dict[str, float]:
+        return {**self.timings, "total": round(self.elapsed(), 4)}
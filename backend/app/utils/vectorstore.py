@@ -0,0 +1,193 @@
+# app/utils/vectorstore.py
+from typing import NamedTuple, Optional
+from uuid import UUID
+
+from langchain.schema import Document as LC_Document
+
+from app.core.clients import clients
+from app.core.config import settings
+from app.utils.hashing import sha256_text
+from app.vectorstores import VectorBackend, VectorCollection
+
+COLLECTION_NAME = "agent_store"  # Shared collection used before per-agent routing
+AGENT_COLLECTION_PREFIX = "agent_"
+
+def chunk_id(doc_id: str, text: str) -> str:
+    """Content-addressed vector id: the same chunk of a document always maps to the same id"""
+    return f"{doc_id}:{sha256_text(text)}"
+
+def staged_agent_id(agent_id: str) -> str:
+    """agent_id value for chunks that are written but not yet visible to retrieval"""
+    return f"staged:{agent_id}"
+
+def retired_agent_id(agent_id: str) -> str:
+    """agent_id value for chunks that are hidden from retrieval and about to be deleted"""
+    return f"retired:{agent_id}"
+
+def collection_name(agent_id: str) -> str:
+    """Route an agent to its collection according to VECTOR_COLLECTION_MODE.
+
+    per_agent gives every agent its own index, so a query only pays for that
+    agent's vectors; sharded spreads agents over VECTOR_SHARDS collections;
+    shared keeps everything in the single legacy collection.
+    """
+    mode = settings.VECTOR_COLLECTION_MODE
+    if mode == "per_agent":
+        return f"{AGENT_COLLECTION_PREFIX}{UUID(str(agent_id)).hex}"
+    if mode == "sharded":
+        shard = int(sha256_text(str(agent_id)), 16) % settings.VECTOR_SHARDS
+        return f"{COLLECTION_NAME}_{shard:03d}"
+    if mode == "shared":
+        return COLLECTION_NAME
+    raise ValueError(f"Unknown VECTOR_COLLECTION_MODE: {mode}")
+
+def get_backend() -> VectorBackend:
+    return clients.vectors
+
+def get_vectorstore(agent_id: Optional[str] = None, name: Optional[str] = None) -> VectorCollection:
+    """Collection of an agent, or an explicitly named one, in the configured backend"""
+    return clients.collection(name or collection_name(agent_id))
+
+def list_collection_names() -> list[str]:
+    return get_backend().list_collections()
+
+def is_agent_collection(name: str) -> bool:
+    return name == COLLECTION_NAME or name.startswith((AGENT_COLLECTION_PREFIX, f"{COLLECTION_NAME}_"))
+
+def drop_collection(name: str) -> None:
+    get_backend().delete_collection(name)
+
+def add_chunks(vectorstore: VectorCollection, ids: list[str], texts: list[str], metadatas: list[dict]) -> None:
+    """Embed texts (through the embedding cache) and upsert them"""
+    embeddings = clients.embeddings.embed_documents(texts)
+    vectorstore.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=texts)
+
+def get_ids(vectorstore: VectorCollection, where: dict) -> list[str]:
+    return vectorstore.get(where=where, include=[])["ids"]
+
+def get_metadatas(vectorstore: VectorCollection, where: dict) -> dict[str, dict]:
+    result = vectorstore.get(where=where, include=["metadatas"])
+    return dict(zip(result["ids"], result["metadatas"]))
+
+def update_metadatas(vectorstore: VectorCollection, metadatas: dict[str, dict]) -> None:
+    """Rewrite the metadata of many vectors in a single collection update"""
+    if metadatas:
+        vectorstore.update(
+            ids=list(metadatas.keys()),
+            metadatas=list(metadatas.values())
+        )
+
+def delete_vectors(vectorstore: VectorCollection, ids: Optional[list[str]] = None, where: Optional[dict] = None) -> None:
+    if ids:
+        vectorstore.delete(ids=ids)
+    elif where:
+        vectorstore.delete(where=where)
+
+def publish_revision(
+    vectorstore: VectorCollection,
+    doc_id: str,
+    agent_id: str,
+    previous_ids: set[str],
+    kept: dict[str, dict]
+) -> int:
+    """Make a re-ingested document's staged chunks live and retire the removed ones.
+
+    New chunks were written under staged_agent_id(), so retrieval (which
+    filters on agent_id) does not see them yet. Staged and kept chunks are
+    switched to the live agent_id and removed chunks to retired_agent_id()
+    in one collection update, so readers see either the old or the new
+    revision. The retired vectors are deleted afterwards. Returns the number
+    of removed chunks.
+    """
+    staged = get_metadatas(
+        vectorstore,
+        {"$and": [{"doc_id": doc_id}, {"agent_id": staged_agent_id(agent_id)}]}
+    )
+    swap = {cid: {**m, "agent_id": agent_id} for cid, m in staged.items()}
+    swap.update({cid: {**m, "agent_id": agent_id, "doc_id": doc_id} for cid, m in kept.items()})
+    removed = [cid for cid in previous_ids if cid not in swap]
+    swap.update({cid: {"agent_id": retired_agent_id(agent_id), "doc_id": doc_id} for cid in removed})
+
+    update_metadatas(vectorstore, swap)
+    delete_vectors(vectorstore, ids=removed)
+    return len(removed)
+
+def agent_where(agent_id: str) -> dict:
+    """Filter matching an agent's live, staged and retired chunks"""
+    return {"agent_id": {"$in": [agent_id, staged_agent_id(agent_id), retired_agent_id(agent_id)]}}
+
+def count_vectors(vectorstore: VectorCollection) -> int:
+    return vectorstore.count()
+
+def iter_metadatas(vectorstore: VectorCollection, page_size: int = 1000):
+    """Page through (id, metadata) pairs of the whole collection"""
+    offset = 0
+    while True:
+        page = vectorstore.get(include=["metadatas"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            return
+        yield from zip(page["ids"], page["metadatas"])
+        offset += len(page["ids"])
+
+def iter_chunks(vectorstore: VectorCollection, where: dict, page_size: int = 1000):
+    """Page through (id, text, metadata) of the chunks matching a filter"""
+    offset = 0
+    while True:
+        page = vectorstore.get(
+            where=where,
+            include=["documents", "metadatas"],
+            limit=page_size,
+            offset=offset
+        )
+        if not page["ids"]:
+            return
+        yield from zip(page["ids"], page["documents"], page["metadatas"])
+        offset += len(page["ids"])
+
+class Chunk(NamedTuple):
+    id: str
+    document: LC_Document
+    embedding: Optional[list[float]] = None
+
+def _chunks(ids, texts, metadatas, embeddings) -> list[Chunk]:
+    if embeddings is None:
+        embeddings = [None] * len(ids)
+    return [
+        Chunk(cid, LC_Document(page_content=text, metadata=metadata or {}), None if e is None else list(e))
+        for cid, text, metadata, e in zip(ids, texts, metadatas, embeddings)
+    ]
+
+def get_documents(vectorstore: VectorCollection, ids: list[str], with_embeddings: bool = False) -> list[Chunk]:
+    """Chunks with the given ids, in the order requested; missing ids are skipped"""
+    if not ids:
+        return []
+    include = ["documents", "metadatas"] + (["embeddings"] if with_embeddings else [])
+    result = vectorstore.get(ids=ids, include=include)
+    found = {
+        chunk.id: chunk
+        for chunk in _chunks(result["ids"], result["documents"], result["metadatas"], result.get("embeddings"))
+    }
+    return [found[cid] for cid in ids if cid in found]
+
+def query_vectors(
+    vectorstore: VectorCollection,
+    embedding: list[float],
+    k: int,
+    where: dict,
+    with_embeddings: bool = False
+) -> list[Chunk]:
+    """Nearest chunks to an embedding, closest first"""
+    include = ["documents", "metadatas"] + (["embeddings"] if with_embeddings else [])
+    result = vectorstore.query(
+        query_embeddings=[embedding],
+        n_results=k,
+        where=where,
+        include=include
+    )
+    embeddings = result.get("embeddings")
+    return _chunks(
+        result["ids"][0],
+        result["documents"][0],
+        result["metadatas"][0],
+        embeddings[0] if embeddings is not None else None
+    )
@@ -0,0 +1,18 @@
+# app/vectorstores/__init__.py
+from app.core.config import settings
+from app.vectorstores.base import VectorBackend, VectorCollection, matches_where
+
+def create_backend() -> VectorBackend:
+    """Vector storage selected by VECTOR_BACKEND"""
+    if settings.VECTOR_BACKEND == "chroma":
+        from app.vectorstores.chroma import ChromaBackend
+        return ChromaBackend(settings.CHROMA_HOST, settings.CHROMA_PORT, settings.CHROMA_PERSIST_DIR)
+    if settings.VECTOR_BACKEND == "local":
+        from app.vectorstores.local import LocalBackend
+        return LocalBackend(
+            settings.LOCAL_VECTOR_DIR,
+            dtype=settings.LOCAL_VECTOR_DTYPE,
+            ann_min_vectors=settings.LOCAL_ANN_MIN_VECTORS,
+            ann_ef_search=settings.LOCAL_ANN_EF_SEARCH
+        )
+    raise ValueError(f"Unknown VECTOR_BACKEND: {settings.VECTOR_BACKEND}")
@@ -0,0 +1,110 @@
+# app/vectorstores/base.py
+from abc import ABC, abstractmethod
+from typing import Optional
+
+class VectorCollection(ABC):
+    """A named set of (id, embedding, document, metadata) records.
+
+    Arguments and results follow chromadb's Collection API: get() returns a
+    dict of parallel lists, query() a dict of lists per query embedding, and
+    where filters use Chroma's operators ($and, $or, $eq, $ne, $in, $nin,
+    $gt, $gte, $lt, $lte).
+    """
+
+    name: str
+
+    @abstractmethod
+    def upsert(
+        self,
+        ids: list[str],
+        embeddings: list[list[float]],
+        metadatas: list[dict],
+        documents: list[str]
+    ) -> None:
+        ...
+
+    @abstractmethod
+    def get(
+        self,
+        ids: Optional[list[str]] = None,
+        where: Optional[dict] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: Optional[list[str]] = None
+    ) -> dict:
+        ...
+
+    @abstractmethod
+    def query(
+        self,
+        query_embeddings: list[list[float]],
+        n_results: int,
+        where: Optional[dict] = None,
+        include: Optional[list[str]] = None
+    ) -> dict:
+        ...
+
+    @abstractmethod
+    def update(self, ids: list[str], metadatas: list[dict]) -> None:
+        """Replace the metadata of existing records, all or nothing"""
+        ...
+
+    @abstractmethod
+    def delete(self, ids: Optional[list[str]] = None, where: Optional[dict] = None) -> None:
+        ...
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+class VectorBackend(ABC):
+    """Storage holding one VectorCollection per collection name"""
+
+    @abstractmethod
+    def get_collection(self, name: str) -> VectorCollection:
+        """Open a collection, creating it when it does not exist"""
+        ...
+
+    @abstractmethod
+    def list_collections(self) -> list[str]:
+        ...
+
+    @abstractmethod
+    def delete_collection(self, name: str) -> None:
+        ...
+
+    def close(self) -> None:
+        pass
+
+_OPERATORS = {
+    "$eq": lambda value, operand: value == operand,
+    "$ne": lambda value, operand: value != operand,
+    "$in": lambda value, operand: value in operand,
+    "$nin": lambda value, operand: value not in operand,
+    "$gt": lambda value, operand: value is not None and value > operand,
+    "$gte": lambda value, operand: value is not None and value >= operand,
+    "$lt": lambda value, operand: value is not None and value < operand,
+    "$lte": lambda value, operand: value is not None and value <= operand,
+}
+
+def matches_where(metadata: dict, where: Optional[dict]) -> bool:
+    """Evaluate a Chroma-style where filter against one record's metadata"""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, part) for part in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, part) for part in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, operand in condition.items():
+                if operator not in _OPERATORS:
+                    raise ValueError(f"Unsupported where operator: {operator}")
+                if not _OPERATORS[operator](value, operand):
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
@@ -0,0 +1,77 @@
+# app/vectorstores/chroma.py
+import threading
+from typing import Optional
+
+import chromadb
+
+from app.vectorstores.base import VectorBackend, VectorCollection
+
+class ChromaCollection(VectorCollection):
+    """Thin adapter over a chromadb collection"""
+
+    def __init__(self, collection):
+        self.name = collection.name
+        self._collection = collection
+
+    def upsert(self, ids, embeddings, metadatas, documents) -> None:
+        self._collection.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=documents)
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=None) -> dict:
+        return self._collection.get(
+            ids=ids,
+            where=where,
+            limit=limit,
+            offset=offset,
+            include=include if include is not None else ["metadatas", "documents"]
+        )
+
+    def query(self, query_embeddings, n_results, where=None, include=None) -> dict:
+        return self._collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where,
+            include=include if include is not None else ["metadatas", "documents", "distances"]
+        )
+
+    def update(self, ids, metadatas) -> None:
+        self._collection.update(ids=ids, metadatas=metadatas)
+
+    def delete(self, ids=None, where=None) -> None:
+        self._collection.delete(ids=ids, where=where)
+
+    def count(self) -> int:
+        return self._collection.count()
+
+class ChromaBackend(VectorBackend):
+    """Chroma server when host is set, embedded persistent Chroma otherwise"""
+
+    def __init__(self, host: Optional[str], port: int, persist_dir: str):
+        if host:
+            self.client = chromadb.HttpClient(host=host, port=port)
+        else:
+            self.client = chromadb.PersistentClient(path=persist_dir)
+        self._lock = threading.Lock()
+        self._collections: dict[str, ChromaCollection] = {}
+
+    def get_collection(self, name: str) -> ChromaCollection:
+        with self._lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                # Embeddings are always computed by the application
+                collection = ChromaCollection(
+                    self.client.get_or_create_collection(name, embedding_function=None)
+                )
+                self._collections[name] = collection
+            return collection
+
+    def list_collections(self) -> list[str]:
+        names = []
+        for collection in self.client.list_collections():
+            # chromadb >= 0.6 returns names, older versions Collection objects
+            names.append(collection if isinstance(collection, str) else collection.name)
+        return names
+
+    def delete_collection(self, name: str) -> None:
+        with self._lock:
+            self._collections.pop(name, None)
+        self.client.delete_collection(name)
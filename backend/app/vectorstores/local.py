@@ -0,0 +1,356 @@
+# app/vectorstores/local.py
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+from typing import Optional
+
+import numpy as np
+
+from app.vectorstores.base import VectorBackend, VectorCollection, matches_where
+
+try:
+    import hnswlib
+except ImportError:  # ANN search is optional, exact search always works
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+SEARCH_BLOCK_ROWS = 65_536  # Rows scored per matrix product during exact search
+
+class LocalCollection(VectorCollection):
+    """Collection stored in one directory: vectors.bin and chunks.sqlite3.
+
+    Vectors are L2-normalized and appended to vectors.bin as a raw
+    float16/float32 matrix that is memory-mapped for search, so similarity
+    is a dot product and only the pages that are touched stay resident.
+    Row numbers are positions in that matrix. Documents and metadata live in
+    SQLite; metadata is also kept in memory to evaluate where filters.
+
+    Deleted and overwritten rows are tombstoned and reclaimed by compact()
+    once they outnumber the live ones. Collections with at least
+    ann_min_vectors matching rows are searched through an HNSW graph when
+    hnswlib is installed, smaller ones by exact search.
+
+    Writes are only visible to the process that made them, so this backend
+    is meant for single-process deployments.
+    """
+
+    def __init__(self, name: str, path: str, dtype: str, ann_min_vectors: int, ann_ef_search: int):
+        self.name = name
+        self.path = path
+        self.ann_min_vectors = ann_min_vectors
+        self.ann_ef_search = ann_ef_search
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+        self._vectors_path = os.path.join(path, "vectors.bin")
+
+        self._db = sqlite3.connect(os.path.join(path, "chunks.sqlite3"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " row INTEGER PRIMARY KEY,"
+            " id TEXT NOT NULL,"
+            " document TEXT,"
+            " metadata TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        info = dict(self._db.execute("SELECT key, value FROM info").fetchall())
+        self.dtype = np.dtype(info.get("dtype", dtype))
+        self.dim: Optional[int] = int(info["dim"]) if "dim" in info else None
+
+        self._row_of: dict[str, int] = {}
+        self._ids: dict[int, str] = {}
+        self._metadata: dict[int, dict] = {}
+        for row, vector_id, metadata in self._db.execute("SELECT row, id, metadata FROM chunks ORDER BY row"):
+            self._row_of[vector_id] = row
+            self._ids[row] = vector_id
+            self._metadata[row] = json.loads(metadata)
+        self._ann = None
+        self._masks: dict[str, np.ndarray] = {}
+        self._map_vectors()
+
+    def _map_vectors(self) -> None:
+        rows = 0
+        if self.dim and os.path.exists(self._vectors_path):
+            rows = os.path.getsize(self._vectors_path) // (self.dim * self.dtype.itemsize)
+        if rows:
+            self._vectors = np.memmap(self._vectors_path, dtype=self.dtype, mode="r", shape=(rows, self.dim))
+        else:
+            self._vectors = np.empty((0, self.dim or 0), dtype=self.dtype)
+        self._live = np.zeros(rows, dtype=bool)
+        self._live[list(self._metadata)] = True
+        self._masks.clear()
+
+    def _normalize(self, embeddings) -> np.ndarray:
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def _mask(self, where: Optional[dict]) -> np.ndarray:
+        """Boolean mask of live rows matching the filter, cached until the next write"""
+        if not where:
+            return self._live
+        key = json.dumps(where, sort_keys=True)
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = np.zeros(len(self._live), dtype=bool)
+            rows = [row for row, metadata in self._metadata.items() if matches_where(metadata, where)]
+            mask[rows] = True
+            self._masks[key] = mask
+        return mask
+
+    def _tombstone(self, rows: list[int]) -> None:
+        for row in rows:
+            del self._row_of[self._ids.pop(row)]
+            del self._metadata[row]
+        if rows:
+            self._live[rows] = False
+            if self._ann is not None:
+                for row in rows:
+                    self._ann.mark_deleted(row)
+
+    def upsert(self, ids, embeddings, metadatas, documents) -> None:
+        if not ids:
+            return
+        vectors = self._normalize(embeddings)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._db.execute("INSERT INTO info (key, value) VALUES ('dim', ?), ('dtype', ?)", (str(self.dim), self.dtype.name))
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match collection dimension {self.dim}")
+
+            replaced = [self._row_of[i] for i in ids if i in self._row_of]
+            start = len(self._live)
+            rows = list(range(start, start + len(ids)))
+            with self._db:
+                if replaced:
+                    self._db.executemany("DELETE FROM chunks WHERE row = ?", [(row,) for row in replaced])
+                self._db.executemany(
+                    "INSERT INTO chunks (row, id, document, metadata) VALUES (?, ?, ?, ?)",
+                    [(row, i, doc, json.dumps(m or {})) for row, i, doc, m in zip(rows, ids, documents, metadatas)]
+                )
+                with open(self._vectors_path, "ab") as f:
+                    f.write(vectors.astype(self.dtype).tobytes())
+
+            self._tombstone(replaced)
+            for row, vector_id, metadata in zip(rows, ids, metadatas):
+                self._row_of[vector_id] = row
+                self._ids[row] = vector_id
+                self._metadata[row] = metadata or {}
+            self._map_vectors()
+            if self._ann is not None:
+                if self._ann.get_max_elements() < len(self._live):
+                    self._ann.resize_index(2 * len(self._live))
+                self._ann.add_items(vectors, np.asarray(rows))
+            self._maybe_compact()
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=None) -> dict:
+        include = include if include is not None else ["metadatas", "documents"]
+        with self._lock:
+            if ids is not None:
+                rows = [self._row_of[i] for i in ids if i in self._row_of]
+                if where:
+                    mask = self._mask(where)
+                    rows = [row for row in rows if mask[row]]
+            else:
+                rows = np.flatnonzero(self._mask(where)).tolist()
+            rows = rows[offset or 0:]
+            if limit is not None:
+                rows = rows[:limit]
+            return self._records(rows, include)
+
+    def _records(self, rows: list[int], include: list[str]) -> dict:
+        result = {
+            "ids": [self._ids[row] for row in rows],
+            "metadatas": None,
+            "documents": None,
+            "embeddings": None,
+        }
+        if "metadatas" in include:
+            result["metadatas"] = [dict(self._metadata[row]) for row in rows]
+        if "documents" in include:
+            documents = {}
+            for start in range(0, len(rows), 500):
+                part = rows[start:start + 500]
+                documents.update(self._db.execute(
+                    f"SELECT row, document FROM chunks WHERE row IN ({','.join('?' * len(part))})", part
+                ).fetchall())
+            result["documents"] = [documents.get(row) for row in rows]
+        if "embeddings" in include:
+            result["embeddings"] = [self._vectors[row].astype(np.float32).tolist() for row in rows]
+        return result
+
+    def query(self, query_embeddings, n_results, where=None, include=None) -> dict:
+        include = include if include is not None else ["metadatas", "documents", "distances"]
+        results = {"ids": [], "metadatas": [], "documents": [], "embeddings": [], "distances": []}
+        with self._lock:
+            mask = self._mask(where)
+            matching = int(mask.sum())
+            for query in self._normalize(query_embeddings):
+                k = min(n_results, matching)
+                rows, scores = self._search(query, k, mask, matching) if k else ([], [])
+                records = self._records(rows, include)
+                for key in ("ids", "metadatas", "documents", "embeddings"):
+                    results[key].append(records[key])
+                results["distances"].append([1.0 - float(s) for s in scores])
+        return results
+
+    def _search(self, query: np.ndarray, k: int, mask: np.ndarray, matching: int) -> tuple[list[int], list[float]]:
+        if matching >= self.ann_min_vectors and self._ensure_ann():
+            try:
+                if matching == len(self._metadata):
+                    labels, distances = self._ann.knn_query(query, k=k)
+                else:
+                    labels, distances = self._ann.knn_query(query, k=k, filter=lambda row: bool(mask[row]))
+                # hnswlib "ip" distance is 1 - dot product
+                return labels[0].tolist(), (1.0 - distances[0]).tolist()
+            except RuntimeError as e:
+                logger.warning(f"ANN search in {self.name} failed, using exact search: {str(e)}")
+
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start in range(0, len(self._live), SEARCH_BLOCK_ROWS):
+            block_mask = mask[start:start + SEARCH_BLOCK_ROWS]
+            if not block_mask.any():
+                continue
+            scores = np.asarray(self._vectors[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32) @ query
+            scores[~block_mask] = -np.inf
+            top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+            best_rows = np.concatenate([best_rows, top + start])
+            best_scores = np.concatenate([best_scores, scores[top]])
+        order = np.argsort(-best_scores)[:k]
+        keep = order[np.isfinite(best_scores[order])]
+        return best_rows[keep].tolist(), best_scores[keep].tolist()
+
+    def _ensure_ann(self) -> bool:
+        if hnswlib is None:
+            return False
+        if self._ann is None:
+            index = hnswlib.Index(space="ip", dim=self.dim)
+            index.init_index(max_elements=max(2 * len(self._live), 1024), ef_construction=200, M=16)
+            for start in range(0, len(self._live), SEARCH_BLOCK_ROWS):
+                rows = np.flatnonzero(self._live[start:start + SEARCH_BLOCK_ROWS]) + start
+                if len(rows):
+                    index.add_items(np.asarray(self._vectors[rows], dtype=np.float32), rows)
+            index.set_ef(self.ann_ef_search)
+            self._ann = index
+            logger.info(f"Built HNSW index for {self.name} ({int(self._live.sum())} vectors)")
+        return True
+
+    def update(self, ids, metadatas) -> None:
+        with self._lock:
+            missing = [i for i in ids if i not in self._row_of]
+            if missing:
+                raise ValueError(f"Unknown ids in {self.name}: {missing[:5]}")
+            rows = [self._row_of[i] for i in ids]
+            with self._db:
+                self._db.executemany(
+                    "UPDATE chunks SET metadata = ? WHERE row = ?",
+                    [(json.dumps(m or {}), row) for row, m in zip(rows, metadatas)]
+                )
+            for row, metadata in zip(rows, metadatas):
+                self._metadata[row] = metadata or {}
+            self._masks.clear()
+
+    def delete(self, ids=None, where=None) -> None:
+        with self._lock:
+            if ids:
+                rows = [self._row_of[i] for i in ids if i in self._row_of]
+            elif where:
+                rows = np.flatnonzero(self._mask(where)).tolist()
+            else:
+                return
+            with self._db:
+                self._db.executemany("DELETE FROM chunks WHERE row = ?", [(row,) for row in rows])
+            self._tombstone(rows)
+            self._masks.clear()
+            self._maybe_compact()
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._metadata)
+
+    def _maybe_compact(self) -> None:
+        dead = len(self._live) - len(self._metadata)
+        if dead > 1000 and dead > len(self._metadata):
+            self.compact()
+
+    def compact(self) -> None:
+        """Rewrite vectors.bin without tombstoned rows and renumber the live ones"""
+        with self._lock:
+            rows = sorted(self._metadata)
+            tmp_path = f"{self._vectors_path}.tmp"
+            with open(tmp_path, "wb") as f:
+                for start in range(0, len(rows), SEARCH_BLOCK_ROWS):
+                    part = rows[start:start + SEARCH_BLOCK_ROWS]
+                    f.write(np.asarray(self._vectors[part], dtype=self.dtype).tobytes())
+            # Ascending order: every target row number is already free
+            with self._db:
+                self._db.executemany(
+                    "UPDATE chunks SET row = ? WHERE row = ?",
+                    [(new, old) for new, old in enumerate(rows) if new != old]
+                )
+            self._vectors = None
+            os.replace(tmp_path, self._vectors_path)
+            self._metadata = {new: self._metadata[old] for new, old in enumerate(rows)}
+            self._ids = {new: self._ids[old] for new, old in enumerate(rows)}
+            self._row_of = {vector_id: row for row, vector_id in self._ids.items()}
+            self._ann = None
+            self._map_vectors()
+            logger.info(f"Compacted {self.name} to {len(rows)} vectors")
+
+    def close(self) -> None:
+        with self._lock:
+            self._vectors = None
+            self._db.close()
+
+class LocalBackend(VectorBackend):
+    """In-process vector storage with one LocalCollection directory per collection"""
+
+    def __init__(self, root: str, dtype: str = "float16", ann_min_vectors: int = 50_000, ann_ef_search: int = 64):
+        if np.dtype(dtype) not in (np.float16, np.float32):
+            raise ValueError(f"Unsupported vector dtype: {dtype}")
+        self.root = root
+        self.dtype = dtype
+        self.ann_min_vectors = ann_min_vectors
+        self.ann_ef_search = ann_ef_search
+        self._lock = threading.Lock()
+        self._collections: dict[str, LocalCollection] = {}
+        os.makedirs(root, exist_ok=True)
+
+    def get_collection(self, name: str) -> LocalCollection:
+        with self._lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                collection = LocalCollection(
+                    name,
+                    os.path.join(self.root, name),
+                    dtype=self.dtype,
+                    ann_min_vectors=self.ann_min_vectors,
+                    ann_ef_search=self.ann_ef_search
+                )
+                self._collections[name] = collection
+            return collection
+
+    def list_collections(self) -> list[str]:
+        return sorted(
+            name for name in os.listdir(self.root)
+            if os.path.isfile(os.path.join(self.root, name, "chunks.sqlite3"))
+        )
+
+    def delete_collection(self, name: str) -> None:
+        with self._lock:
+            collection = self._collections.pop(name, None)
+            if collection is not None:
+                collection.close()
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    def close(self) -> None:
+        with self._lock:
+            for collection in self._collections.values():
+                collection.close()
+            self._collections.clear()